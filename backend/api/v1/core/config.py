@@ -101,6 +101,9 @@ class APIv1Settings(BaseSettings):
     telegram_webhook_secret: Optional[str] = None
     telegram_chat_id: Optional[str] = None
     
+    # ==================== Chatwoot ====================
+    chatwoot_webhook_secret: Optional[str] = None
+    
     # ==================== CORS ====================
     cors_origins: str = "*"  # Comma-separated origins - MUST NOT be "*" in production
     
@@ -114,6 +117,7 @@ class APIv1Settings(BaseSettings):
     enable_bot_routes: bool = True
     enable_admin_routes: bool = True
     enable_public_routes: bool = True
+    enable_test_endpoints: bool = False  # Test fixture routes; opt-in, never mounted in production
     
     model_config = SettingsConfigDict(
         env_file='.env',
@@ -171,6 +171,37 @@ async def _create_indexes():
     except Exception as e:
         logger.error(f"Error creating indexes: {e}")
         # Don't raise - indexes are optional for functionality
+    
+    # Covering indexes get their own try blocks so a conflict with an existing
+    # index (e.g. IndexOptionsConflict) skips only that index
+    try:
+        # Covers the login lookup in authenticate_user (read served from the index)
+        await db.users.create_index(
+            [("username", 1), ("is_active", 1), ("password_hash", 1), ("role", 1),
+             ("referral_code", 1), ("user_id", 1), ("display_name", 1)],
+            name="users_login_cover"
+        )
+    except Exception as e:
+        logger.warning(f"Could not create users_login_cover index: {e}")
+    
+    try:
+        # Covers the public games listing (filter on is_active, sort on
+        # display_name, projected fields) so it is served without a FETCH/SORT
+        await db.games.create_index(
+            [
+                ("is_active", 1),
+                ("display_name", 1),
+                ("game_id", 1),
+                ("game_name", 1),
+                ("description", 1),
+                ("thumbnail", 1),
+                ("category", 1),
+            ],
+            name="active_games_cover",
+            partialFilterExpression={"is_active": True}
+        )
+    except Exception as e:
+        logger.warning(f"Could not create active_games_cover index: {e}")
 
 
 async def close_api_v1_db():
@@ -46,6 +46,9 @@ class MongoDBAdapter:
             {"user_id": user_id},
             {"$set": updates}
         )
+        # Keep validate_token from serving the pre-update user
+        from ..services.auth_service import invalidate_user_cache
+        invalidate_user_cache(user_id)
         return result.modified_count > 0
     
     async def increment_user_field(self, user_id: str, field: str, amount: float) -> bool:
@@ -2,12 +2,17 @@
 API v1 Security Utilities
 Password hashing, token generation, HMAC signing, rate limiting
 """
+import asyncio
 import hashlib
 import hmac
+import os
 import secrets
 import string
 import time
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple, Dict, Any
 from jose import JWTError, jwt
@@ -19,20 +24,56 @@ settings = get_api_settings()
 _rate_limit_store: Dict[str, list] = {}
 _brute_force_store: Dict[str, Dict] = {}
 
+# Brute-force limits, bound once instead of read from settings per attempt
+_BRUTE_FORCE_MAX_ATTEMPTS = settings.brute_force_max_attempts
+_BRUTE_FORCE_LOCKOUT_SECONDS = settings.brute_force_lockout_minutes * 60
+
+
+# Argon2id with web-tuned parameters; legacy bcrypt hashes still verify
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    """Hash a password using argon2id"""
+    return _password_hasher.hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (argon2id or legacy bcrypt)"""
     try:
+        if hashed_password.startswith('$argon2'):
+            return _password_hasher.verify(hashed_password, plain_password)
         return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
     except Exception:
         return False
 
 
+# Password hashing is CPU-bound; run it off the event loop, one thread per core
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password in the hashing thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_HASH_POOL, hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password in the hashing thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _HASH_POOL, verify_password, plain_password, hashed_password
+    )
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True for legacy bcrypt hashes or argon2 hashes with outdated parameters"""
+    if not hashed_password.startswith('$argon2'):
+        return True
+    try:
+        return _password_hasher.check_needs_rehash(hashed_password)
+    except InvalidHashError:
+        return True
+
+
 def generate_referral_code(length: int = 8) -> str:
     """Generate a unique referral code"""
     chars = string.ascii_uppercase + string.digits
@@ -117,23 +158,18 @@ def check_brute_force(identifier: str) -> Tuple[bool, Optional[int]]:
     Check if account is locked due to brute force attempts.
     Returns (is_allowed, lockout_remaining_seconds)
     """
-    now = time.time()
-    
-    if identifier not in _brute_force_store:
+    record = _brute_force_store.get(identifier)
+    if record is None or not record['locked_until']:
         return True, None
     
-    record = _brute_force_store[identifier]
-    
-    # Check if locked
-    if record.get('locked_until'):
-        if now < record['locked_until']:
-            remaining = int(record['locked_until'] - now)
-            return False, remaining
-        else:
-            # Lockout expired, reset
-            del _brute_force_store[identifier]
-            return True, None
+    # Check if still locked
+    now = time.time()
+    if now < record['locked_until']:
+        remaining = int(record['locked_until'] - now)
+        return False, remaining
     
+    # Lockout expired, reset
+    del _brute_force_store[identifier]
     return True, None
 
 
@@ -151,14 +187,13 @@ def record_failed_attempt(identifier: str):
     record['attempts'].append(now)
     
     # Check if should lock
-    if len(record['attempts']) >= settings.brute_force_max_attempts:
-        record['locked_until'] = now + (settings.brute_force_lockout_minutes * 60)
+    if len(record['attempts']) >= _BRUTE_FORCE_MAX_ATTEMPTS:
+        record['locked_until'] = now + _BRUTE_FORCE_LOCKOUT_SECONDS
 
 
 def clear_failed_attempts(identifier: str):
     """Clear failed attempts after successful login"""
-    if identifier in _brute_force_store:
-        del _brute_force_store[identifier]
+    _brute_force_store.pop(identifier, None)
 
 
 def sanitize_input(value: str, max_length: int = 255) -> str:
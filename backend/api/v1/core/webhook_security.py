@@ -193,6 +193,50 @@ def verify_telegram_webhook(
     return True, ""
 
 
+# ==================== CHATWOOT SECURITY ====================
+
+# HMAC key encoded once at import instead of on every request
+_CHATWOOT_SECRET_KEY = (settings.chatwoot_webhook_secret or '').encode()
+
+
+def verify_chatwoot_signature(
+    payload: bytes,
+    signature_header: Optional[str] = None
+) -> tuple[bool, str]:
+    """
+    Verify Chatwoot webhook HMAC-SHA256 signature.
+    
+    Args:
+        payload: Raw request body bytes
+        signature_header: X-Chatwoot-Signature header value ("sha256=xxxx" or "xxxx")
+    
+    Returns:
+        (is_valid, error_message)
+    """
+    if not _CHATWOOT_SECRET_KEY:
+        if settings.is_production:
+            logger.error("CHATWOOT_WEBHOOK_SECRET not configured")
+            return False, "Webhook secret not configured"
+        # Development: signature verification is optional
+        return True, ""
+    
+    if not signature_header:
+        return False, "Missing X-Chatwoot-Signature header"
+    
+    provided_signature = signature_header
+    if provided_signature.startswith('sha256='):
+        provided_signature = provided_signature[len('sha256='):]
+    
+    expected_signature = hmac.new(_CHATWOOT_SECRET_KEY, payload, hashlib.sha256).hexdigest()
+    
+    # Constant-time comparison to prevent timing attacks
+    if not hmac.compare_digest(expected_signature, provided_signature):
+        logger.warning("Invalid Chatwoot webhook signature")
+        return False, "Invalid signature"
+    
+    return True, ""
+
+
 # ==================== GENERAL WEBHOOK SECURITY ====================
 
 def compute_hmac_signature(payload: bytes, secret: str, algorithm: str = 'sha256') -> str:
@@ -6,6 +6,7 @@ Supports feature flags for optional route disabling:
 - ENABLE_BOT_ROUTES (default: true)
 - ENABLE_ADMIN_ROUTES (default: true)  
 - ENABLE_PUBLIC_ROUTES (default: true)
+- ENABLE_TEST_ENDPOINTS (default: false)
 """
 import logging
 from fastapi import APIRouter
@@ -114,4 +115,10 @@ if _env != "production":
 else:
     logger.info("PROD: Wiring audit routes DISABLED")
 
+# TEST-ONLY: Fixture routes for the integration suite (explicit ENABLE_TEST_ENDPOINTS=true)
+if settings.enable_test_endpoints and not settings.is_production:
+    from .testing_routes import router as testing_router
+    api_v1_router.include_router(testing_router)
+    logger.warning("TEST: Fixture routes ENABLED via ENABLE_TEST_ENDPOINTS (ENV=%s)", _env)
+
 __all__ = ["api_v1_router"]
@@ -570,9 +570,8 @@ async def create_client(
             raise HTTPException(status_code=400, detail="Password must be at least 8 characters")
     
     # Hash password IMMEDIATELY
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-    password_hash = pwd_context.hash(plaintext_password)
+    from ..core.security import hash_password_async
+    password_hash = await hash_password_async(plaintext_password)
     
     # Generate referral code
     chars = string.ascii_uppercase + string.digits
@@ -854,6 +853,10 @@ async def update_client(
         params.append(user_id)
         query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ${param_idx}"
         await execute(query, *params)
+        
+        # Status changes must reach token validation immediately
+        from ..services.auth_service import invalidate_user_cache
+        invalidate_user_cache(user_id)
     
     # Log audit
     await log_audit(auth.user_id, auth.username, "client.updated", "user", user_id, {
@@ -891,6 +894,9 @@ async def update_client_overrides(
             f"UPDATE users SET {', '.join(updates)}, updated_at = NOW() WHERE user_id = ${len(params)}",
             *params
         )
+        
+        from ..services.auth_service import invalidate_user_cache
+        invalidate_user_cache(user_id)
     
     await log_audit(auth.user_id, auth.username, "client.overrides_updated", "user", user_id, data.model_dump())
     
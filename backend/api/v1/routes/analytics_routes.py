@@ -669,6 +669,74 @@ async def get_game_analytics(
 
 # ==================== LAYER 5: ADVANCED EFFICIENCY METRICS ====================
 
+# SQL kept as module constants so every call passes the identical query text
+# and asyncpg's per-connection statement cache reuses the prepared plan
+
+_SQL_BONUS_CONVERSION = """
+    SELECT 
+        COALESCE(SUM(bonus_amount), 0) as issued,
+        COALESCE(SUM(bonus_consumed), 0) as converted
+    FROM orders WHERE status = 'APPROVED_EXECUTED' AND created_at >= $1
+"""
+
+_SQL_AVG_DEPOSIT_TO_WITHDRAWAL = """
+    WITH deposit_times AS (
+        SELECT user_id, MIN(approved_at) as first_deposit
+        FROM orders 
+        WHERE order_type = 'deposit' AND status = 'APPROVED_EXECUTED' AND approved_at >= $1
+        GROUP BY user_id
+    ),
+    withdrawal_times AS (
+        SELECT user_id, MIN(approved_at) as first_withdrawal
+        FROM orders 
+        WHERE order_type = 'withdrawal' AND status = 'APPROVED_EXECUTED' AND approved_at >= $1
+        GROUP BY user_id
+    )
+    SELECT AVG(EXTRACT(EPOCH FROM (w.first_withdrawal - d.first_deposit)) / 3600) as avg_hours
+    FROM deposit_times d
+    JOIN withdrawal_times w ON d.user_id = w.user_id
+    WHERE w.first_withdrawal > d.first_deposit
+"""
+
+_SQL_DEPOSIT_WITHDRAW_USERS = """
+    SELECT 
+        COUNT(DISTINCT user_id) FILTER (WHERE order_type = 'deposit') as deposit_users,
+        COUNT(DISTINCT user_id) FILTER (WHERE order_type = 'withdrawal') as withdraw_users
+    FROM orders 
+    WHERE order_type IN ('deposit', 'withdrawal') AND status = 'APPROVED_EXECUTED' AND created_at >= $1
+"""
+
+_SQL_BONUS_ONLY_PLAYERS = """
+    SELECT 
+        COUNT(*) FILTER (WHERE real_balance <= 0 AND bonus_balance > 0) as bonus_only,
+        COUNT(*) as total
+    FROM users WHERE role = 'user' AND is_active = TRUE
+"""
+
+# Rows are narrowed by WHERE before grouping; HAVING guarantees deposited > 0
+_SQL_AVG_MULTIPLIER = """
+    WITH filtered AS (
+        SELECT user_id, amount, payout_amount, order_type
+        FROM orders
+        WHERE created_at >= $1
+          AND status = 'APPROVED_EXECUTED'
+          AND order_type IN ('deposit', 'withdrawal')
+    ),
+    user_totals AS (
+        SELECT 
+            user_id,
+            SUM(amount) FILTER (WHERE order_type = 'deposit') as deposited,
+            SUM(payout_amount) FILTER (WHERE order_type = 'withdrawal') as withdrawn
+        FROM filtered
+        GROUP BY user_id
+        HAVING SUM(amount) FILTER (WHERE order_type = 'deposit') > 0
+    )
+    SELECT AVG(withdrawn::float / deposited::float) as avg_multiplier
+    FROM user_totals
+    WHERE withdrawn > 0
+"""
+
+
 @router.get("/advanced-metrics", summary="Advanced Efficiency Metrics")
 async def get_advanced_metrics(
     request: Request,
@@ -683,76 +751,25 @@ async def get_advanced_metrics(
     since = datetime.now(timezone.utc) - timedelta(days=days)
     
     # Bonus Conversion Ratio
-    bonus_stats = await fetch_one("""
-        SELECT 
-            COALESCE(SUM(bonus_amount), 0) as issued,
-            COALESCE(SUM(bonus_consumed), 0) as converted
-        FROM orders WHERE status = 'APPROVED_EXECUTED' AND created_at >= $1
-    """, since)
+    bonus_stats = await fetch_one(_SQL_BONUS_CONVERSION, since)
     
     bonus_conversion = (float(bonus_stats['converted'] or 0) / float(bonus_stats['issued'] or 1)) * 100
     
     # Average time from deposit to withdrawal
-    avg_time = await fetch_one("""
-        WITH deposit_times AS (
-            SELECT user_id, MIN(approved_at) as first_deposit
-            FROM orders 
-            WHERE order_type = 'deposit' AND status = 'APPROVED_EXECUTED' AND approved_at >= $1
-            GROUP BY user_id
-        ),
-        withdrawal_times AS (
-            SELECT user_id, MIN(approved_at) as first_withdrawal
-            FROM orders 
-            WHERE order_type = 'withdrawal' AND status = 'APPROVED_EXECUTED' AND approved_at >= $1
-            GROUP BY user_id
-        )
-        SELECT AVG(EXTRACT(EPOCH FROM (w.first_withdrawal - d.first_deposit)) / 3600) as avg_hours
-        FROM deposit_times d
-        JOIN withdrawal_times w ON d.user_id = w.user_id
-        WHERE w.first_withdrawal > d.first_deposit
-    """, since)
-    
-    # % Clients never withdrawing
-    total_depositors = await fetch_one("""
-        SELECT COUNT(DISTINCT user_id) as count
-        FROM orders 
-        WHERE order_type = 'deposit' AND status = 'APPROVED_EXECUTED' AND created_at >= $1
-    """, since)
+    avg_time = await fetch_one(_SQL_AVG_DEPOSIT_TO_WITHDRAWAL, since)
     
-    withdrawers = await fetch_one("""
-        SELECT COUNT(DISTINCT user_id) as count
-        FROM orders 
-        WHERE order_type = 'withdrawal' AND status = 'APPROVED_EXECUTED' AND created_at >= $1
-    """, since)
+    # % Clients never withdrawing (depositors and withdrawers in one scan)
+    user_counts = await fetch_one(_SQL_DEPOSIT_WITHDRAW_USERS, since)
     
-    never_withdrawn_pct = 100 - (float(withdrawers['count'] or 0) / float(total_depositors['count'] or 1)) * 100
+    never_withdrawn_pct = 100 - (float(user_counts['withdraw_users'] or 0) / float(user_counts['deposit_users'] or 1)) * 100
     
     # % Bonus-only players (only have bonus balance, no cash)
-    bonus_only = await fetch_one("""
-        SELECT 
-            COUNT(*) FILTER (WHERE real_balance <= 0 AND bonus_balance > 0) as bonus_only,
-            COUNT(*) as total
-        FROM users WHERE role = 'user' AND is_active = TRUE
-    """)
+    bonus_only = await fetch_one(_SQL_BONUS_ONLY_PLAYERS)
     
     bonus_only_pct = (float(bonus_only['bonus_only'] or 0) / float(bonus_only['total'] or 1)) * 100
     
     # Average multiplier reached (payout / deposit ratio)
-    multiplier_data = await fetch_one("""
-        WITH user_totals AS (
-            SELECT 
-                user_id,
-                SUM(amount) FILTER (WHERE order_type = 'deposit' AND status = 'APPROVED_EXECUTED') as deposited,
-                SUM(payout_amount) FILTER (WHERE order_type = 'withdrawal' AND status = 'APPROVED_EXECUTED') as withdrawn
-            FROM orders
-            WHERE created_at >= $1
-            GROUP BY user_id
-            HAVING SUM(amount) FILTER (WHERE order_type = 'deposit' AND status = 'APPROVED_EXECUTED') > 0
-        )
-        SELECT AVG(withdrawn / NULLIF(deposited, 0)) as avg_multiplier
-        FROM user_totals
-        WHERE withdrawn > 0
-    """, since)
+    multiplier_data = await fetch_one(_SQL_AVG_MULTIPLIER, since)
     
     return {
         "period_days": days,
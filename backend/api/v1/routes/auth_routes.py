@@ -12,11 +12,10 @@ from ..models import (
     TokenValidationResponse, APIError
 )
 from ..services import (
-    create_user, authenticate_user, create_magic_link, 
-    consume_magic_link, validate_token, log_audit
+    create_user, authenticate_user, create_access_token, create_magic_link, 
+    consume_magic_link, validate_token, log_audit, invalidate_user_cache
 )
 from ..core.config import ErrorCodes, get_api_settings
-from ..core.security import create_jwt_token
 from .dependencies import get_client_ip, check_rate_limiting, authenticate_request, AuthResult
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -76,17 +75,8 @@ async def login(request: Request, login_data: LoginRequest):
             }
         )
     
-    # Create JWT token - use 'sub' key for user_id as expected by validate_token
-    token_data = {
-        "sub": result['user_id'],
-        "user_id": result['user_id'],
-        "username": result['username'],
-        "display_name": result['display_name'],
-        "referral_code": result['referral_code'],
-        "role": result.get('role', 'user'),
-        "type": "access"
-    }
-    access_token = create_jwt_token(token_data)
+    # Create JWT token - 'sub' carries user_id as expected by validate_token
+    access_token = create_access_token(result)
     
     return LoginResponse(
         success=True,
@@ -280,6 +270,8 @@ async def update_profile(
             *params
         )
     
+    invalidate_user_cache(auth.user_id)
+    
     return {"success": True, "message": "Profile updated successfully"}
 
 
@@ -291,8 +283,7 @@ async def change_password(
     auth: AuthResult = Depends(authenticate_request)
 ):
     """Change user password"""
-    from passlib.context import CryptContext
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    from ..core.security import hash_password_async, verify_password_async
     
     pool = await get_pool()
     
@@ -307,11 +298,11 @@ async def change_password(
             raise HTTPException(404, "User not found")
         
         # Verify current password
-        if not pwd_context.verify(current_password, user['password_hash']):
+        if not await verify_password_async(current_password, user['password_hash']):
             raise HTTPException(401, "Current password is incorrect")
         
         # Hash new password
-        new_hash = pwd_context.hash(new_password)
+        new_hash = await hash_password_async(new_password)
         
         # Update password
         await conn.execute(
@@ -3,17 +3,49 @@ Chatwoot Integration Routes
 Receives alerts/webhooks from Chatwoot and forwards to Telegram
 """
 import logging
+import time
+from functools import lru_cache
 from fastapi import APIRouter, Request, HTTPException, Header
 from typing import Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
+from ..core.webhook_security import verify_chatwoot_signature
 from ..services.telegram_bot import send_telegram_message
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chatwoot", tags=["Chatwoot Integration"])
 
+# Recently forwarded alerts keyed by (conversation_id, timestamp) -> expiry.
+# Chatwoot retries deliveries on 5xx, so repeats inside the TTL are suppressed.
+_ALERT_DEDUP_TTL_SECONDS = 300
+_ALERT_DEDUP_MAX_ENTRIES = 100_000
+_seen_alerts: dict = {}
+
+# Emoji based on severity
+_SEVERITY_EMOJI = {
+    "low": "🟢",
+    "medium": "🟡",
+    "high": "🟠",
+    "critical": "🔴"
+}
+
+# Message text shown in Telegram; only this much reaches the cached formatters
+_ALERT_MESSAGE_PREVIEW_CHARS = 500
+_WEBHOOK_CONTENT_PREVIEW_CHARS = 300
+
+# Static fields of the alert sent by POST /chatwoot/test
+_TEST_ALERT_FIELDS = {
+    "severity": "medium",
+    "reason": "TEST_ALERT",
+    "conversation_id": 12345,
+    "customer_name": "Test Customer",
+    "customer_email": "test@example.com",
+    "message": "This is a test alert from the Chatwoot integration endpoint.",
+    "chatwoot_url": "https://app.chatwoot.com/app/accounts/1/conversations/12345",
+}
+
 
 # ==================== Models ====================
 
@@ -24,7 +56,7 @@ class ChatwootAlert(BaseModel):
     conversation_id: int = Field(..., description="Chatwoot conversation ID")
     customer_name: Optional[str] = Field(None, description="Customer name")
     customer_email: Optional[str] = Field(None, description="Customer email")
-    message: str = Field(..., description="Customer message")
+    message: str = Field(..., max_length=10_000, description="Customer message")
     timestamp: Optional[str] = Field(None, description="Alert timestamp")
     chatwoot_url: Optional[str] = Field(None, description="Direct link to conversation")
     additional_info: Optional[dict] = Field(None, description="Any additional metadata")
@@ -43,47 +75,67 @@ class ChatwootWebhook(BaseModel):
 
 def format_alert_message(alert: ChatwootAlert) -> str:
     """Format alert for Telegram with proper HTML formatting"""
+    info_items = None
+    if alert.additional_info:
+        info_items = tuple((key, str(value)) for key, value in alert.additional_info.items())
     
-    # Emoji based on severity
-    severity_emoji = {
-        "low": "🟢",
-        "medium": "🟡", 
-        "high": "🟠",
-        "critical": "🔴"
-    }
+    # Truncate before the cached call so cache keys never hold full messages
+    return _format_alert_impl(
+        alert.severity, alert.reason, alert.conversation_id,
+        alert.customer_name, alert.customer_email,
+        alert.message[:_ALERT_MESSAGE_PREVIEW_CHARS],
+        len(alert.message) > _ALERT_MESSAGE_PREVIEW_CHARS,
+        alert.timestamp, alert.chatwoot_url, info_items
+    )
+
+
+@lru_cache(maxsize=1024)
+def _format_alert_impl(
+    severity: str,
+    reason: str,
+    conversation_id: int,
+    customer_name: Optional[str],
+    customer_email: Optional[str],
+    message: str,
+    message_truncated: bool,
+    timestamp: Optional[str],
+    chatwoot_url: Optional[str],
+    info_items: Optional[tuple]
+) -> str:
+    """Build the alert text from hashable fields (cached for replayed alerts)"""
     
-    emoji = severity_emoji.get(alert.severity.lower(), "⚠️")
+    emoji = _SEVERITY_EMOJI.get(severity.lower(), "⚠️")
     
     # Build message
     lines = [
-        f"{emoji} <b>CHATWOOT ALERT - {alert.severity.upper()}</b>",
+        f"{emoji} <b>CHATWOOT ALERT - {severity.upper()}</b>",
         "",
-        f"<b>Reason:</b> {alert.reason}",
-        f"<b>Conversation ID:</b> #{alert.conversation_id}",
+        f"<b>Reason:</b> {reason}",
+        f"<b>Conversation ID:</b> #{conversation_id}",
     ]
     
-    if alert.customer_name:
-        lines.append(f"<b>Customer:</b> {alert.customer_name}")
+    if customer_name:
+        lines.append(f"<b>Customer:</b> {customer_name}")
     
-    if alert.customer_email:
-        lines.append(f"<b>Email:</b> {alert.customer_email}")
+    if customer_email:
+        lines.append(f"<b>Email:</b> {customer_email}")
     
     lines.append("")
     lines.append(f"<b>Message:</b>")
-    lines.append(f"<i>{alert.message[:500]}{'...' if len(alert.message) > 500 else ''}</i>")
+    lines.append(f"<i>{message}{'...' if message_truncated else ''}</i>")
     
-    if alert.timestamp:
+    if timestamp:
         lines.append("")
-        lines.append(f"<b>Time:</b> {alert.timestamp}")
+        lines.append(f"<b>Time:</b> {timestamp}")
     
-    if alert.chatwoot_url:
+    if chatwoot_url:
         lines.append("")
-        lines.append(f"🔗 <a href='{alert.chatwoot_url}'>View in Chatwoot</a>")
+        lines.append(f"🔗 <a href='{chatwoot_url}'>View in Chatwoot</a>")
     
-    if alert.additional_info:
+    if info_items:
         lines.append("")
         lines.append("<b>Additional Info:</b>")
-        for key, value in alert.additional_info.items():
+        for key, value in info_items:
             lines.append(f"  • {key}: {value}")
     
     return "\n".join(lines)
@@ -91,33 +143,92 @@ def format_alert_message(alert: ChatwootAlert) -> str:
 
 def format_webhook_message(webhook: ChatwootWebhook) -> str:
     """Format generic webhook for Telegram"""
+    conv = webhook.conversation or {}
+    sender = webhook.sender
+    msg = webhook.message
+    
+    status = conv.get('status')
+    content = str(msg.get('content', '') or '') if msg else None
+    
+    # Payload fields are arbitrary JSON; coerce to str so the cache key is always
+    # hashable, and truncate content so cache keys never hold full messages
+    return _format_webhook_impl(
+        webhook.event,
+        str(conv.get('id', 'N/A')) if webhook.conversation else None,
+        str(status) if status else None,
+        str(sender.get('name', 'Unknown')) if sender else None,
+        content[:_WEBHOOK_CONTENT_PREVIEW_CHARS] if content is not None else None,
+        content is not None and len(content) > _WEBHOOK_CONTENT_PREVIEW_CHARS
+    )
+
+
+@lru_cache(maxsize=1024)
+def _format_webhook_impl(
+    event: str,
+    conversation_id: Optional[str],
+    status: Optional[str],
+    sender_name: Optional[str],
+    content: Optional[str],
+    content_truncated: bool
+) -> str:
+    """Build the webhook text from hashable fields (cached for redeliveries)"""
     
     lines = [
         "📬 <b>CHATWOOT WEBHOOK</b>",
         "",
-        f"<b>Event:</b> {webhook.event}",
+        f"<b>Event:</b> {event}",
     ]
     
-    if webhook.conversation:
-        conv = webhook.conversation
-        lines.append(f"<b>Conversation:</b> #{conv.get('id', 'N/A')}")
-        if conv.get('status'):
-            lines.append(f"<b>Status:</b> {conv.get('status')}")
+    if conversation_id is not None:
+        lines.append(f"<b>Conversation:</b> #{conversation_id}")
+        if status:
+            lines.append(f"<b>Status:</b> {status}")
     
-    if webhook.sender:
-        sender = webhook.sender
-        lines.append(f"<b>From:</b> {sender.get('name', 'Unknown')}")
+    if sender_name is not None:
+        lines.append(f"<b>From:</b> {sender_name}")
     
-    if webhook.message:
-        msg = webhook.message
-        content = msg.get('content', '')
+    if content is not None:
         lines.append("")
         lines.append(f"<b>Message:</b>")
-        lines.append(f"<i>{content[:300]}{'...' if len(content) > 300 else ''}</i>")
+        lines.append(f"<i>{content}{'...' if content_truncated else ''}</i>")
     
     return "\n".join(lines)
 
 
+def _alert_dedup_key(alert: ChatwootAlert) -> Optional[tuple]:
+    """Dedup key for an alert, or None when it has no timestamp to tell retries apart"""
+    if not alert.timestamp:
+        return None
+    return (alert.conversation_id, alert.timestamp)
+
+
+def is_duplicate_alert(alert: ChatwootAlert) -> bool:
+    """Check whether this alert was already forwarded within the dedup TTL"""
+    key = _alert_dedup_key(alert)
+    if key is None:
+        return False
+    expires_at = _seen_alerts.get(key)
+    return expires_at is not None and expires_at > time.monotonic()
+
+
+def mark_alert_forwarded(alert: ChatwootAlert):
+    """Remember a successfully forwarded alert so retries are suppressed"""
+    key = _alert_dedup_key(alert)
+    if key is None:
+        return
+    
+    now = time.monotonic()
+    
+    # Drop expired entries before the store grows past its bound
+    if len(_seen_alerts) >= _ALERT_DEDUP_MAX_ENTRIES:
+        for k in [k for k, exp in _seen_alerts.items() if exp <= now]:
+            del _seen_alerts[k]
+        if len(_seen_alerts) >= _ALERT_DEDUP_MAX_ENTRIES:
+            _seen_alerts.clear()
+    
+    _seen_alerts[key] = now + _ALERT_DEDUP_TTL_SECONDS
+
+
 # ==================== Routes ====================
 
 @router.post("/alerts")
@@ -137,6 +248,15 @@ async def receive_alert(
     try:
         logger.info(f"Received Chatwoot alert: {alert.reason} - Severity: {alert.severity}")
         
+        if is_duplicate_alert(alert):
+            logger.info(f"Duplicate Chatwoot alert suppressed: Conversation #{alert.conversation_id}")
+            return {
+                "success": True,
+                "message": "Duplicate alert suppressed",
+                "duplicate": True,
+                "conversation_id": alert.conversation_id
+            }
+        
         # Format message for Telegram
         telegram_message = format_alert_message(alert)
         
@@ -147,6 +267,7 @@ async def receive_alert(
         )
         
         if result:
+            mark_alert_forwarded(alert)
             logger.info(f"Alert forwarded to Telegram: Conversation #{alert.conversation_id}")
             return {
                 "success": True,
@@ -184,15 +305,17 @@ async def receive_webhook(
     - conversation_updated
     - etc.
     
-    Optional: Add signature verification using x-chatwoot-signature header
+    Signed with CHATWOOT_WEBHOOK_SECRET via the x-chatwoot-signature header
+    (required when the secret is configured, and always in production)
     """
+    is_valid, error = verify_chatwoot_signature(await request.body(), x_chatwoot_signature)
+    if not is_valid:
+        logger.warning(f"Rejected Chatwoot webhook: {error}")
+        raise HTTPException(status_code=401, detail=error)
+    
     try:
         logger.info(f"Received Chatwoot webhook: {webhook.event}")
         
-        # Optional: Verify signature here if needed
-        # if x_chatwoot_signature:
-        #     verify_chatwoot_signature(await request.body(), x_chatwoot_signature)
-        
         # Format message for Telegram
         telegram_message = format_webhook_message(webhook)
         
@@ -239,14 +362,8 @@ async def test_alert():
     Send a test alert to Telegram
     """
     test_alert = ChatwootAlert(
-        severity="medium",
-        reason="TEST_ALERT",
-        conversation_id=12345,
-        customer_name="Test Customer",
-        customer_email="test@example.com",
-        message="This is a test alert from the Chatwoot integration endpoint.",
+        **_TEST_ALERT_FIELDS,
         timestamp=datetime.utcnow().isoformat(),
-        chatwoot_url="https://app.chatwoot.com/app/accounts/1/conversations/12345",
         additional_info={
             "test": True,
             "source": "API test endpoint"
@@ -91,24 +91,27 @@ async def resolve_identity(request: Request, data: IdentityResolveRequest):
         }
     
     # Identity not found - create new user
-    from ..core.security import generate_referral_code, hash_password
+    from ..core.security import hash_password_async
+    from ..core.database import get_db
+    from ..services import pick_free_referral_code
     import secrets
     
     user_id = str(uuid.uuid4())
     username = f"{provider}_{external_id[:8]}_{secrets.token_hex(4)}"
     display_name = data.display_name or f"User {external_id[:8]}"
-    referral_code = generate_referral_code()
     temp_password = secrets.token_hex(16)
     
-    # Ensure unique referral code
-    while await fetch_one("SELECT user_id FROM users WHERE referral_code = $1", referral_code):
-        referral_code = generate_referral_code()
+    # Ensure unique referral code, checking a batch of candidates per query
+    db = await get_db()
+    referral_code = None
+    while referral_code is None:
+        referral_code = await pick_free_referral_code(db)
     
     # Create user
     await execute('''
         INSERT INTO users (user_id, username, password_hash, display_name, referral_code)
         VALUES ($1, $2, $3, $4, $5)
-    ''', user_id, username, hash_password(temp_password), display_name, referral_code)
+    ''', user_id, username, await hash_password_async(temp_password), display_name, referral_code)
     
     # Create identity link
     identity_id = str(uuid.uuid4())
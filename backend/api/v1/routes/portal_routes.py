@@ -1046,8 +1046,8 @@ async def set_client_password(
             )
         
         # Hash password
-        from ..core.security import hash_password
-        password_hash = hash_password(password)
+        from ..core.security import hash_password_async
+        password_hash = await hash_password_async(password)
         
         # Update user
         await execute("""
@@ -1056,6 +1056,10 @@ async def set_client_password(
             WHERE user_id = $3
         """, username, password_hash, user_id)
         
+        # Username is part of the cached validate_token user
+        from ..services.auth_service import invalidate_user_cache
+        invalidate_user_cache(user_id)
+        
         return {
             "success": True,
             "message": "Password login set up successfully"
@@ -10,11 +10,11 @@ Features:
 """
 from fastapi import APIRouter, Request, Header, HTTPException
 from typing import Optional, List
-from datetime import datetime, timezone
+from datetime import datetime
 from pydantic import BaseModel, Field
 import uuid
 
-from ..core.database import fetch_one, fetch_all, execute
+from ..core.database import fetch_one, fetch_all, execute, get_pool
 
 router = APIRouter(prefix="/promotions", tags=["Promotions"])
 
@@ -64,7 +64,7 @@ async def ensure_promotions_table():
     try:
         await execute('''
             CREATE TABLE IF NOT EXISTS promotions (
-                promo_id VARCHAR(36) PRIMARY KEY,
+                promo_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                 title VARCHAR(100) NOT NULL,
                 subtitle VARCHAR(200),
                 description TEXT,
@@ -81,7 +81,7 @@ async def ensure_promotions_table():
                 is_active BOOLEAN DEFAULT TRUE,
                 views INTEGER DEFAULT 0,
                 clicks INTEGER DEFAULT 0,
-                created_by VARCHAR(36),
+                created_by UUID,
                 created_at TIMESTAMPTZ DEFAULT NOW(),
                 updated_at TIMESTAMPTZ DEFAULT NOW()
             )
@@ -92,6 +92,31 @@ async def ensure_promotions_table():
         pass
 
 
+@router.on_event("startup")
+async def migrate_promotions_schema():
+    """Migrate promotions tables created with VARCHAR(36) ids to native UUID (16 bytes)"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Serialize workers starting together; the block is a no-op once migrated
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('promotions_uuid_ids'))")
+            await conn.execute('''
+                DO $$
+                BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'promotions' AND column_name = 'promo_id'
+                          AND data_type = 'character varying'
+                    ) THEN
+                        ALTER TABLE promotions
+                            ALTER COLUMN promo_id TYPE UUID USING promo_id::uuid,
+                            ALTER COLUMN promo_id SET DEFAULT gen_random_uuid(),
+                            ALTER COLUMN created_by TYPE UUID USING created_by::uuid;
+                    END IF;
+                END $$
+            ''')
+
+
 # ==================== AUTH HELPERS ====================
 
 async def require_admin_access(request: Request, authorization: str):
@@ -129,20 +154,19 @@ async def get_active_promotions(
     await ensure_promotions_table()
     
     user = await get_current_user_optional(request, authorization)
-    now = datetime.now(timezone.utc)
     
-    # Get active promotions within date range
+    # Get active promotions within date range (NOW() evaluated by Postgres)
     promos = await fetch_all("""
         SELECT promo_id, title, subtitle, description, image_url,
                cta_text, cta_link, badge_text, background_color, text_color,
                priority, start_date, end_date, target_segment
         FROM promotions
         WHERE is_active = TRUE
-          AND start_date <= $1
-          AND end_date >= $1
+          AND start_date <= NOW()
+          AND end_date >= NOW()
         ORDER BY priority DESC, created_at DESC
         LIMIT 10
-    """, now)
+    """)
     
     # Filter by segment if applicable
     result = []
@@ -163,7 +187,7 @@ async def get_active_promotions(
 
 
 @router.post("/track-view/{promo_id}", summary="Track promotion view")
-async def track_view(promo_id: str):
+async def track_view(promo_id: uuid.UUID):
     """Increment view count for a promotion"""
     await ensure_promotions_table()
     await execute("UPDATE promotions SET views = views + 1 WHERE promo_id = $1", promo_id)
@@ -171,7 +195,7 @@ async def track_view(promo_id: str):
 
 
 @router.post("/track-click/{promo_id}", summary="Track promotion click")
-async def track_click(promo_id: str):
+async def track_click(promo_id: uuid.UUID):
     """Increment click count for a promotion"""
     await ensure_promotions_table()
     await execute("UPDATE promotions SET clicks = clicks + 1 WHERE promo_id = $1", promo_id)
@@ -189,30 +213,22 @@ async def get_all_promotions(
     await require_admin_access(request, authorization)
     await ensure_promotions_table()
     
+    # Status is derived from the dates in SQL
     promos = await fetch_all("""
-        SELECT * FROM promotions
+        SELECT *,
+               CASE
+                   WHEN NOT is_active THEN 'disabled'
+                   WHEN end_date < NOW() THEN 'expired'
+                   WHEN start_date > NOW() THEN 'scheduled'
+                   ELSE 'active'
+               END AS status
+        FROM promotions
         ORDER BY priority DESC, created_at DESC
     """)
     
-    now = datetime.now(timezone.utc)
-    
-    # Add status field based on dates
-    result = []
-    for p in promos:
-        promo = dict(p)
-        if not promo['is_active']:
-            promo['status'] = 'disabled'
-        elif promo['end_date'] < now:
-            promo['status'] = 'expired'
-        elif promo['start_date'] > now:
-            promo['status'] = 'scheduled'
-        else:
-            promo['status'] = 'active'
-        result.append(promo)
-    
     return {
         "success": True,
-        "promotions": result
+        "promotions": [dict(p) for p in promos]
     }
 
 
@@ -226,7 +242,7 @@ async def create_promotion(
     admin = await require_admin_access(request, authorization)
     await ensure_promotions_table()
     
-    promo_id = str(uuid.uuid4())
+    promo_id = uuid.uuid4()
     
     await execute('''
         INSERT INTO promotions (
@@ -239,13 +255,13 @@ async def create_promotion(
        data.priority, data.start_date, data.end_date, data.target_segment, data.is_active,
        admin.user_id)
     
-    return {"success": True, "promo_id": promo_id, "message": "Promotion created"}
+    return {"success": True, "promo_id": str(promo_id), "message": "Promotion created"}
 
 
 @router.put("/admin/{promo_id}", summary="Update promotion (admin)")
 async def update_promotion(
     request: Request,
-    promo_id: str,
+    promo_id: uuid.UUID,
     data: PromotionUpdate,
     authorization: str = Header(...)
 ):
@@ -291,7 +307,7 @@ async def update_promotion(
 @router.delete("/admin/{promo_id}", summary="Delete promotion (admin)")
 async def delete_promotion(
     request: Request,
-    promo_id: str,
+    promo_id: uuid.UUID,
     authorization: str = Header(...)
 ):
     """Delete a promotion"""
@@ -311,18 +327,16 @@ async def get_promotion_stats(
     await require_admin_access(request, authorization)
     await ensure_promotions_table()
     
-    now = datetime.now(timezone.utc)
-    
     stats = await fetch_one("""
         SELECT 
             COUNT(*) as total,
-            COUNT(*) FILTER (WHERE is_active AND start_date <= $1 AND end_date >= $1) as active,
-            COUNT(*) FILTER (WHERE is_active AND start_date > $1) as scheduled,
-            COUNT(*) FILTER (WHERE end_date < $1) as expired,
+            COUNT(*) FILTER (WHERE is_active AND start_date <= NOW() AND end_date >= NOW()) as active,
+            COUNT(*) FILTER (WHERE is_active AND start_date > NOW()) as scheduled,
+            COUNT(*) FILTER (WHERE end_date < NOW()) as expired,
             SUM(views) as total_views,
             SUM(clicks) as total_clicks
         FROM promotions
-    """, now)
+    """)
     
     return {
         "success": True,
@@ -3,10 +3,16 @@ Public APIs - No authentication required
 For public games site and hero slider
 """
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from typing import List, Dict, Any
-from ..core.database import get_db, serialize_docs
+from ..core.database import get_db
 
-router = APIRouter(prefix="/public", tags=["public"])
+# orjson serializes datetimes natively, so documents are returned as-is
+# (with _id projected out) instead of going through serialize_docs
+router = APIRouter(prefix="/public", tags=["public"], default_response_class=ORJSONResponse)
+
+# Platforms are static for now; one shared tuple is reused for every game
+_PLATFORMS = ("android", "ios", "pc")
 
 
 @router.get("/games")
@@ -21,6 +27,7 @@ async def get_public_games():
     cursor = db.games.find(
         {"is_active": True},
         {
+            "_id": 0,
             "game_id": 1,
             "game_name": 1,
             "display_name": 1,
@@ -32,11 +39,10 @@ async def get_public_games():
     ).sort("display_name", 1)
     
     games = await cursor.to_list(length=100)
-    games = serialize_docs(games)
     
     # Add platforms (static for now)
     for game in games:
-        game["platforms"] = ["android", "ios", "pc"]
+        game["platforms"] = _PLATFORMS
         game["downloadUrl"] = f"/downloads/{game.get('game_name', 'game')}"
     
     return {
@@ -60,6 +66,7 @@ async def get_hero_slider():
             "promotion_type": {"$in": ["hero_slider", "banner"]}
         },
         {
+            "_id": 0,
             "promotion_id": 1,
             "title": 1,
             "description": 1,
@@ -72,7 +79,6 @@ async def get_hero_slider():
     ).sort("display_order", 1).limit(10)
     
     slides = await cursor.to_list(length=10)
-    slides = serialize_docs(slides)
     
     return {
         "success": True,
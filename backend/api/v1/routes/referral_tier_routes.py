@@ -17,21 +17,36 @@ Override Priority:
 2. Global campaign override
 3. Tier-based percentage
 """
-from fastapi import APIRouter, Request, Header, HTTPException, status
+from fastapi import APIRouter, Request, Header, HTTPException, Depends, Query, status
+from fastapi.responses import ORJSONResponse
 from typing import Optional, List
 from datetime import datetime, timezone
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ConfigDict
+import asyncio
+import bisect
+import logging
+import time
 import uuid
 
-from ..core.database import fetch_one, fetch_all, execute
+from ..core.database import fetch_one, fetch_all, execute, get_pool
 
-router = APIRouter(prefix="/admin/referral-tiers", tags=["Admin - Referral Tiers"])
+logger = logging.getLogger(__name__)
+
+# fetch_all already returns plain dicts, so rows are handed to orjson as-is;
+# list endpoints return ORJSONResponse directly to skip jsonable_encoder
+router = APIRouter(
+    prefix="/admin/referral-tiers",
+    tags=["Admin - Referral Tiers"],
+    default_response_class=ORJSONResponse
+)
 
 
 # ==================== MODELS ====================
 
 class ReferralTier(BaseModel):
     """Referral tier definition"""
+    model_config = ConfigDict(extra='forbid')
+    
     tier_name: str
     min_referrals: int
     max_referrals: Optional[int] = None  # None = unlimited
@@ -42,6 +57,8 @@ class ReferralTier(BaseModel):
 
 class GlobalOverride(BaseModel):
     """Global bonus override for campaigns"""
+    model_config = ConfigDict(extra='forbid')
+    
     name: str
     bonus_percentage: float = Field(..., ge=0, le=100)
     start_date: datetime
@@ -52,6 +69,8 @@ class GlobalOverride(BaseModel):
 
 class ClientOverrideCreate(BaseModel):
     """Individual client bonus override"""
+    model_config = ConfigDict(extra='forbid')
+    
     user_id: str
     bonus_percentage: float = Field(..., ge=0, le=100)
     expires_at: Optional[datetime] = None
@@ -60,6 +79,9 @@ class ClientOverrideCreate(BaseModel):
 
 class ClientOverrideUpdate(BaseModel):
     """Update client override"""
+    # The admin UI resends user_id with updates
+    model_config = ConfigDict(extra='ignore')
+    
     bonus_percentage: Optional[float] = Field(None, ge=0, le=100)
     expires_at: Optional[datetime] = None
     reason: Optional[str] = None
@@ -68,91 +90,332 @@ class ClientOverrideUpdate(BaseModel):
 
 # ==================== AUTH HELPER ====================
 
+async def _request_user(request: Request, authorization: str):
+    """Authenticate once per request, reusing the user get_current_user stored on request.state"""
+    user = getattr(request.state, "current_user", None)
+    if user is None:
+        from ..core.auth import get_current_user
+        user = await get_current_user(request, authorization, None)
+    return user
+
+
 async def require_admin_access(request: Request, authorization: str):
     """Require admin role"""
-    from ..core.auth import get_current_user
-    user = await get_current_user(request, authorization, None)
+    user = await _request_user(request, authorization)
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
 
+def utcnow() -> datetime:
+    """Request timestamp, shared by every query and check in a handler"""
+    return datetime.now(timezone.utc)
+
+
 # ==================== DATABASE SCHEMA SETUP ====================
 
-async def ensure_tier_tables():
-    """Create referral tier tables if they don't exist"""
-    try:
-        await execute('''
-            CREATE TABLE IF NOT EXISTS referral_tiers (
-                tier_id VARCHAR(36) PRIMARY KEY,
-                tier_name VARCHAR(50) UNIQUE NOT NULL,
-                min_referrals INTEGER NOT NULL,
-                max_referrals INTEGER,
-                bonus_percentage FLOAT NOT NULL,
-                description TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                updated_at TIMESTAMPTZ DEFAULT NOW()
-            )
-        ''')
-        
-        await execute('''
-            CREATE TABLE IF NOT EXISTS referral_global_overrides (
-                override_id VARCHAR(36) PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                bonus_percentage FLOAT NOT NULL,
-                start_date TIMESTAMPTZ NOT NULL,
-                end_date TIMESTAMPTZ NOT NULL,
-                description TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_by VARCHAR(36),
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                updated_at TIMESTAMPTZ DEFAULT NOW()
-            )
-        ''')
-        
-        await execute('''
-            CREATE TABLE IF NOT EXISTS referral_client_overrides (
-                override_id VARCHAR(36) PRIMARY KEY,
-                user_id VARCHAR(36) NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
-                bonus_percentage FLOAT NOT NULL,
-                expires_at TIMESTAMPTZ,
-                reason TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_by VARCHAR(36),
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                updated_at TIMESTAMPTZ DEFAULT NOW(),
-                UNIQUE(user_id)
+# Bump when adding DDL below; pending versions are applied once at startup
+_TIER_SCHEMA_VERSION = 1
+
+
+@router.on_event("startup")
+async def migrate_tier_schema():
+    """Apply pending referral tier migrations, keeping DDL out of the request path"""
+    await execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            applied_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    ''')
+    row = await fetch_one("SELECT MAX(version) AS v FROM schema_migrations")
+    if row and (row.get('v') or 0) >= _TIER_SCHEMA_VERSION:
+        return
+    
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Serialize workers starting together, then re-check under the lock
+            await conn.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+            if (await conn.fetchval("SELECT MAX(version) FROM schema_migrations") or 0) >= _TIER_SCHEMA_VERSION:
+                return
+            await _create_tier_tables(conn)
+            await conn.execute(
+                "INSERT INTO schema_migrations (version) VALUES ($1) ON CONFLICT DO NOTHING",
+                _TIER_SCHEMA_VERSION
             )
-        ''')
+    logger.info(f"Referral tier schema migrated to version {_TIER_SCHEMA_VERSION}")
+
+
+async def _create_tier_tables(conn):
+    """Create the tier tables and seed default tiers"""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_tiers (
+            tier_id VARCHAR(36) PRIMARY KEY,
+            tier_name VARCHAR(50) UNIQUE NOT NULL,
+            min_referrals INTEGER NOT NULL,
+            max_referrals INTEGER,
+            bonus_percentage FLOAT NOT NULL,
+            description TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    ''')
+    
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_global_overrides (
+            override_id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            bonus_percentage FLOAT NOT NULL,
+            start_date TIMESTAMPTZ NOT NULL,
+            end_date TIMESTAMPTZ NOT NULL,
+            description TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_by VARCHAR(36),
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    ''')
+    
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS referral_client_overrides (
+            override_id VARCHAR(36) PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            bonus_percentage FLOAT NOT NULL,
+            expires_at TIMESTAMPTZ,
+            reason TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_by VARCHAR(36),
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            UNIQUE(user_id)
+        )
+    ''')
+    
+    # Indexes for effective-bonus resolution
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_client_overrides_active
+        ON referral_client_overrides (user_id)
+        INCLUDE (bonus_percentage, expires_at, reason)
+        WHERE is_active
+    ''')
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_global_overrides_active
+        ON referral_global_overrides (start_date, end_date, bonus_percentage DESC)
+        WHERE is_active
+    ''')
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tiers_min_ref_active
+        ON referral_tiers (min_referrals)
+        WHERE is_active
+    ''')
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_referred_by
+        ON users (referred_by_user_id)
+    ''')
+    
+    # Materialized referral count, kept current by trigger
+    await conn.execute('''
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS referral_count INTEGER NOT NULL DEFAULT 0
+    ''')
+    await conn.execute('''
+        CREATE OR REPLACE FUNCTION _bump_ref_count() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.referred_by_user_id IS NOT NULL THEN
+                UPDATE users SET referral_count = referral_count - 1
+                WHERE user_id = OLD.referred_by_user_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.referred_by_user_id IS NOT NULL THEN
+                UPDATE users SET referral_count = referral_count + 1
+                WHERE user_id = NEW.referred_by_user_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    await conn.execute('''
+        DROP TRIGGER IF EXISTS trg_users_referral_count ON users
+    ''')
+    await conn.execute('''
+        CREATE TRIGGER trg_users_referral_count
+        AFTER INSERT OR DELETE OR UPDATE OF referred_by_user_id ON users
+        FOR EACH ROW EXECUTE FUNCTION _bump_ref_count()
+    ''')
+    await conn.execute('''
+        UPDATE users u SET referral_count = c.n
+        FROM (
+            SELECT referred_by_user_id, COUNT(*) AS n FROM users
+            WHERE referred_by_user_id IS NOT NULL
+            GROUP BY referred_by_user_id
+        ) c
+        WHERE u.user_id = c.referred_by_user_id AND u.referral_count <> c.n
+    ''')
+    
+    # Seed default tiers if none exist
+    if await conn.fetchval("SELECT COUNT(*) FROM referral_tiers") == 0:
+        default_tiers = [
+            ('STARTER', 'Starter', 0, 6, 10.0, 'Entry level - 0-6 referrals'),
+            ('SILVER', 'Silver', 7, 14, 15.0, 'Silver tier - 7-14 referrals'),
+            ('GOLD', 'Gold', 15, 29, 20.0, 'Gold tier - 15-29 referrals'),
+            ('PLATINUM', 'Platinum', 30, 49, 25.0, 'Platinum tier - 30-49 referrals'),
+            ('RUBY', 'Ruby', 50, None, 30.0, 'Ruby tier - 50+ referrals (highest)'),
+        ]
+        ids, names, mins, maxs, pcts, descs = (list(col) for col in zip(*default_tiers))
+        await conn.execute('''
+            INSERT INTO referral_tiers (tier_id, tier_name, min_referrals, max_referrals, bonus_percentage, description)
+            SELECT * FROM unnest($1::text[], $2::text[], $3::int[], $4::int[], $5::float[], $6::text[])
+        ''', ids, names, mins, maxs, pcts, descs)
+    
+    # Precomputed effective bonus per user (client > global > tier > default)
+    await conn.execute('''
+        CREATE MATERIALIZED VIEW IF NOT EXISTS effective_bonus_mv AS
+        SELECT u.user_id,
+               u.referral_count,
+               COALESCE(co.bonus_percentage, go.bonus_percentage, tr.bonus_percentage, 10.0)
+                   AS effective_percentage,
+               CASE
+                   WHEN co.bonus_percentage IS NOT NULL THEN 'individual_override'
+                   WHEN go.bonus_percentage IS NOT NULL THEN 'global_campaign'
+                   WHEN tr.bonus_percentage IS NOT NULL THEN 'tier'
+                   ELSE 'default'
+               END AS source,
+               tr.tier_name,
+               go.name AS campaign_name,
+               NOW() AS refreshed_at
+        FROM users u
+        LEFT JOIN referral_client_overrides co
+            ON co.user_id = u.user_id AND co.is_active
+           AND (co.expires_at IS NULL OR co.expires_at > NOW())
+        LEFT JOIN LATERAL (
+            SELECT name, bonus_percentage FROM referral_global_overrides
+            WHERE is_active AND start_date <= NOW() AND end_date >= NOW()
+            ORDER BY bonus_percentage DESC
+            LIMIT 1
+        ) go ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT tier_name, bonus_percentage FROM referral_tiers
+            WHERE is_active AND min_referrals <= u.referral_count
+              AND (max_referrals IS NULL OR max_referrals >= u.referral_count)
+            ORDER BY min_referrals DESC
+            LIMIT 1
+        ) tr ON TRUE
+    ''')
+    # Unique index is required for REFRESH ... CONCURRENTLY
+    await conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_effective_bonus_mv_user
+        ON effective_bonus_mv (user_id)
+    ''')
+
+
+# ==================== CACHED LOOKUPS ====================
+
+class _CachedQuery:
+    """
+    Process-local TTL cache for a single query result.
+    A lock prevents a thundering herd on expiry, and clear() bumps a
+    generation counter so a load racing with an invalidation is not stored.
+    """
+    
+    def __init__(self, ttl_seconds: float, loader):
+        self.ttl_seconds = ttl_seconds
+        self._loader = loader
+        self._value = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+    
+    async def get(self):
+        """Return the cached value, reloading it once expired"""
+        if time.monotonic() < self._expires_at:
+            return self._value
         
-        # Seed default tiers if none exist
-        existing = await fetch_one("SELECT COUNT(*) as count FROM referral_tiers")
-        if existing['count'] == 0:
-            default_tiers = [
-                ('STARTER', 'Starter', 0, 6, 10.0, 'Entry level - 0-6 referrals'),
-                ('SILVER', 'Silver', 7, 14, 15.0, 'Silver tier - 7-14 referrals'),
-                ('GOLD', 'Gold', 15, 29, 20.0, 'Gold tier - 15-29 referrals'),
-                ('PLATINUM', 'Platinum', 30, 49, 25.0, 'Platinum tier - 30-49 referrals'),
-                ('RUBY', 'Ruby', 50, None, 30.0, 'Ruby tier - 50+ referrals (highest)'),
-            ]
-            for tier_id, name, min_ref, max_ref, pct, desc in default_tiers:
-                await execute('''
-                    INSERT INTO referral_tiers (tier_id, tier_name, min_referrals, max_referrals, bonus_percentage, description)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                ''', tier_id, name, min_ref, max_ref, pct, desc)
-    except Exception as e:
-        # Tables may already exist - that's fine
-        pass
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return self._value
+            
+            generation = self._generation
+            value = await self._loader()
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl_seconds
+            return value
+    
+    def clear(self):
+        """Invalidate the cached value"""
+        self._generation += 1
+        self._value = None
+        self._expires_at = 0.0
+
+
+class _TierTable:
+    """
+    Active tiers sorted by min_referrals, with a parallel list of the
+    minimums so a referral count resolves to its tier with bisect.
+    """
+    
+    def __init__(self, rows: list):
+        self.rows = sorted(rows, key=lambda t: t['min_referrals'])
+        self.mins = [t['min_referrals'] for t in self.rows]
+    
+    def position(self, count: int) -> int:
+        """Number of tiers whose min_referrals is <= count"""
+        return bisect.bisect_right(self.mins, count)
+    
+    def resolve(self, count: int) -> Optional[dict]:
+        """Tier whose referral range contains `count`"""
+        idx = self.position(count) - 1
+        if idx < 0:
+            return None
+        tier = self.rows[idx]
+        if tier['max_referrals'] is not None and tier['max_referrals'] < count:
+            return None
+        return tier
+
+
+async def _load_active_tiers() -> _TierTable:
+    """Active tier definitions"""
+    return _TierTable(await fetch_all("""
+        SELECT tier_name, min_referrals, max_referrals, bonus_percentage, description
+        FROM referral_tiers
+        WHERE is_active = TRUE
+    """))
+
+
+async def _load_global_overrides() -> list:
+    """Active global overrides that have not ended, best bonus first"""
+    return await fetch_all("""
+        SELECT name, bonus_percentage, description, start_date, end_date
+        FROM referral_global_overrides
+        WHERE is_active = TRUE AND end_date >= NOW()
+        ORDER BY bonus_percentage DESC
+    """)
+
+
+# Tiers and campaigns change on human timescales; the admin endpoints that
+# modify them clear these caches
+_TIER_CACHE = _CachedQuery(60, _load_active_tiers)
+_GLOBAL_OVERRIDE_CACHE = _CachedQuery(30, _load_global_overrides)
+
+
+async def get_current_global_override(now: datetime) -> Optional[dict]:
+    """Highest-bonus global override running at `now`, if any"""
+    for override in await _GLOBAL_OVERRIDE_CACHE.get():
+        if override['start_date'] <= now <= override['end_date']:
+            return override
+    return None
 
 
 # ==================== TIER ENDPOINTS ====================
 
 @router.get("/tiers", summary="Get all referral tiers")
-async def get_tiers(request: Request, authorization: str = Header(...)):
+async def get_tiers(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    authorization: str = Header(...)
+):
     """Get all tier definitions"""
     await require_admin_access(request, authorization)
-    await ensure_tier_tables()
     
     tiers = await fetch_all("""
         SELECT tier_id, tier_name, min_referrals, max_referrals, 
@@ -160,12 +423,13 @@ async def get_tiers(request: Request, authorization: str = Header(...)):
                created_at, updated_at
         FROM referral_tiers
         ORDER BY min_referrals ASC
-    """)
+        LIMIT $1 OFFSET $2
+    """, limit, offset)
     
-    return {
+    return ORJSONResponse({
         "success": True,
-        "tiers": [dict(t) for t in tiers]
-    }
+        "tiers": tiers
+    })
 
 
 @router.put("/tiers/{tier_id}", summary="Update a tier")
@@ -177,7 +441,6 @@ async def update_tier(
 ):
     """Update tier configuration"""
     admin = await require_admin_access(request, authorization)
-    await ensure_tier_tables()
     
     result = await execute('''
         UPDATE referral_tiers
@@ -187,6 +450,7 @@ async def update_tier(
         WHERE tier_id = $1
     ''', tier_id, data.tier_name, data.min_referrals, data.max_referrals,
        data.bonus_percentage, data.description, data.is_active)
+    _TIER_CACHE.clear()
     
     return {"success": True, "message": "Tier updated"}
 
@@ -194,31 +458,42 @@ async def update_tier(
 # ==================== GLOBAL OVERRIDE ENDPOINTS ====================
 
 @router.get("/global-overrides", summary="Get global overrides")
-async def get_global_overrides(request: Request, authorization: str = Header(...)):
+async def get_global_overrides(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    authorization: str = Header(...)
+):
     """Get all global bonus overrides (campaigns)"""
     await require_admin_access(request, authorization)
-    await ensure_tier_tables()
     
     overrides = await fetch_all("""
         SELECT override_id, name, bonus_percentage, start_date, end_date,
-               description, is_active, created_by, created_at
+               description, is_active, created_by, created_at,
+               (is_active AND start_date <= NOW() AND end_date >= NOW()) AS is_current
         FROM referral_global_overrides
         ORDER BY start_date DESC
-    """)
-    
-    # Check which one is currently active
-    now = datetime.now(timezone.utc)
-    active_override = None
-    for o in overrides:
-        if o['is_active'] and o['start_date'] <= now <= o['end_date']:
-            active_override = dict(o)
-            break
-    
-    return {
+        LIMIT $1 OFFSET $2
+    """, limit, offset)
+    
+    # Currently active override, flagged by the database; it may sit on
+    # another page, so look it up directly when this page can't rule it out
+    active_override = next((o for o in overrides if o['is_current']), None)
+    if active_override is None and (offset > 0 or len(overrides) == limit):
+        active_override = await fetch_one("""
+            SELECT override_id, name, bonus_percentage, start_date, end_date,
+                   description, is_active, created_by, created_at, TRUE AS is_current
+            FROM referral_global_overrides
+            WHERE is_active = TRUE AND start_date <= NOW() AND end_date >= NOW()
+            ORDER BY start_date DESC
+            LIMIT 1
+        """)
+    
+    return ORJSONResponse({
         "success": True,
-        "overrides": [dict(o) for o in overrides],
+        "overrides": overrides,
         "active_override": active_override
-    }
+    })
 
 
 @router.post("/global-overrides", summary="Create global override")
@@ -229,7 +504,6 @@ async def create_global_override(
 ):
     """Create a global bonus override campaign"""
     admin = await require_admin_access(request, authorization)
-    await ensure_tier_tables()
     
     override_id = str(uuid.uuid4())
     await execute('''
@@ -238,6 +512,7 @@ async def create_global_override(
         VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
     ''', override_id, data.name, data.bonus_percentage, data.start_date,
        data.end_date, data.description, data.is_active, admin.user_id)
+    _GLOBAL_OVERRIDE_CACHE.clear()
     
     return {"success": True, "override_id": override_id, "message": "Global override created"}
 
@@ -259,6 +534,7 @@ async def update_global_override(
         WHERE override_id = $1
     ''', override_id, data.name, data.bonus_percentage, data.start_date,
        data.end_date, data.description, data.is_active)
+    _GLOBAL_OVERRIDE_CACHE.clear()
     
     return {"success": True, "message": "Global override updated"}
 
@@ -273,6 +549,7 @@ async def delete_global_override(
     await require_admin_access(request, authorization)
     
     await execute("DELETE FROM referral_global_overrides WHERE override_id = $1", override_id)
+    _GLOBAL_OVERRIDE_CACHE.clear()
     
     return {"success": True, "message": "Global override deleted"}
 
@@ -280,22 +557,29 @@ async def delete_global_override(
 # ==================== CLIENT OVERRIDE ENDPOINTS ====================
 
 @router.get("/client-overrides", summary="Get all client overrides")
-async def get_client_overrides(request: Request, authorization: str = Header(...)):
+async def get_client_overrides(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    authorization: str = Header(...)
+):
     """Get all individual client overrides"""
     await require_admin_access(request, authorization)
-    await ensure_tier_tables()
     
     overrides = await fetch_all("""
-        SELECT co.*, u.username, u.display_name
+        SELECT co.override_id, co.user_id, co.bonus_percentage, co.expires_at,
+               co.reason, co.is_active, co.created_at,
+               u.username, u.display_name
         FROM referral_client_overrides co
         JOIN users u ON u.user_id = co.user_id
         ORDER BY co.created_at DESC
-    """)
+        LIMIT $1 OFFSET $2
+    """, limit, offset)
     
-    return {
+    return ORJSONResponse({
         "success": True,
-        "overrides": [dict(o) for o in overrides]
-    }
+        "overrides": overrides
+    })
 
 
 @router.post("/client-overrides", summary="Create client override")
@@ -306,37 +590,32 @@ async def create_client_override(
 ):
     """Create an individual client bonus override"""
     admin = await require_admin_access(request, authorization)
-    await ensure_tier_tables()
-    
-    # Check user exists
-    user = await fetch_one("SELECT user_id FROM users WHERE user_id = $1", data.user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if override already exists
-    existing = await fetch_one(
-        "SELECT override_id FROM referral_client_overrides WHERE user_id = $1",
-        data.user_id
-    )
-    
-    if existing:
-        # Update existing
-        await execute('''
-            UPDATE referral_client_overrides
-            SET bonus_percentage = $2, expires_at = $3, reason = $4, is_active = TRUE, updated_at = NOW()
-            WHERE user_id = $1
-        ''', data.user_id, data.bonus_percentage, data.expires_at, data.reason)
-        return {"success": True, "message": "Client override updated"}
     
+    # Single round-trip upsert; the EXISTS guard yields no row for unknown users.
+    # Parameters are cast explicitly: $2 appears twice and must deduce one type
     override_id = str(uuid.uuid4())
-    await execute('''
+    row = await fetch_one('''
         INSERT INTO referral_client_overrides 
         (override_id, user_id, bonus_percentage, expires_at, reason, created_by)
-        VALUES ($1, $2, $3, $4, $5, $6)
-    ''', override_id, data.user_id, data.bonus_percentage, data.expires_at, 
+        SELECT $1::varchar, $2::varchar, $3::float8, $4::timestamptz, $5::text, $6::varchar
+        WHERE EXISTS (SELECT 1 FROM users WHERE user_id = $2::varchar)
+        ON CONFLICT (user_id) DO UPDATE
+        SET bonus_percentage = EXCLUDED.bonus_percentage,
+            expires_at = EXCLUDED.expires_at,
+            reason = EXCLUDED.reason,
+            is_active = TRUE,
+            updated_at = NOW()
+        RETURNING override_id, (xmax = 0) AS inserted
+    ''', override_id, data.user_id, data.bonus_percentage, data.expires_at,
        data.reason, admin.user_id)
     
-    return {"success": True, "override_id": override_id, "message": "Client override created"}
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if not row['inserted']:
+        return {"success": True, "message": "Client override updated"}
+    
+    return {"success": True, "override_id": row['override_id'], "message": "Client override created"}
 
 
 @router.put("/client-overrides/{user_id}", summary="Update client override")
@@ -349,34 +628,17 @@ async def update_client_override(
     """Update a client override"""
     await require_admin_access(request, authorization)
     
-    updates = []
-    params = [user_id]
-    idx = 2
-    
-    if data.bonus_percentage is not None:
-        updates.append(f"bonus_percentage = ${idx}")
-        params.append(data.bonus_percentage)
-        idx += 1
-    
-    if data.expires_at is not None:
-        updates.append(f"expires_at = ${idx}")
-        params.append(data.expires_at)
-        idx += 1
-    
-    if data.reason is not None:
-        updates.append(f"reason = ${idx}")
-        params.append(data.reason)
-        idx += 1
-    
-    if data.is_active is not None:
-        updates.append(f"is_active = ${idx}")
-        params.append(data.is_active)
-        idx += 1
-    
-    if updates:
-        updates.append("updated_at = NOW()")
-        query = f"UPDATE referral_client_overrides SET {', '.join(updates)} WHERE user_id = $1"
-        await execute(query, *params)
+    # Fixed statement so the driver reuses one prepared plan; None keeps the current value
+    if data.model_dump(exclude_none=True):
+        await execute('''
+            UPDATE referral_client_overrides
+            SET bonus_percentage = COALESCE($2, bonus_percentage),
+                expires_at = COALESCE($3, expires_at),
+                reason = COALESCE($4, reason),
+                is_active = COALESCE($5, is_active),
+                updated_at = NOW()
+            WHERE user_id = $1
+        ''', user_id, data.bonus_percentage, data.expires_at, data.reason, data.is_active)
     
     return {"success": True, "message": "Client override updated"}
 
@@ -401,7 +663,8 @@ async def delete_client_override(
 async def get_effective_bonus(
     request: Request,
     user_id: str,
-    authorization: str = Header(...)
+    authorization: str = Header(...),
+    now: datetime = Depends(utcnow)
 ):
     """
     Calculate the effective referral bonus percentage for a user.
@@ -412,44 +675,45 @@ async def get_effective_bonus(
     3. Tier-based percentage (based on referral count)
     """
     await require_admin_access(request, authorization)
-    await ensure_tier_tables()
-    
-    now = datetime.now(timezone.utc)
-    
-    # Get user's referral count
-    referral_count = await fetch_one("""
-        SELECT COUNT(*) as count FROM users WHERE referred_by_user_id = $1
-    """, user_id)
-    count = referral_count['count'] if referral_count else 0
     
-    # 1. Check for individual override
-    client_override = await fetch_one("""
-        SELECT bonus_percentage, expires_at, reason
-        FROM referral_client_overrides
-        WHERE user_id = $1 AND is_active = TRUE
-    """, user_id)
-    
-    if client_override:
-        if client_override['expires_at'] is None or client_override['expires_at'] > now:
-            return {
-                "success": True,
-                "user_id": user_id,
-                "referral_count": count,
-                "effective_percentage": client_override['bonus_percentage'],
-                "source": "individual_override",
-                "reason": client_override['reason'],
-                "details": dict(client_override)
+    # Referral count and active client override in one round-trip
+    row = await fetch_one("""
+        WITH ref AS (
+            SELECT COALESCE((SELECT referral_count FROM users WHERE user_id = $1), 0) AS c
+        ),
+        co AS (
+            SELECT bonus_percentage, expires_at, reason
+            FROM referral_client_overrides
+            WHERE user_id = $1 AND is_active = TRUE
+              AND (expires_at IS NULL OR expires_at > $2)
+            LIMIT 1
+        )
+        SELECT ref.c AS referral_count,
+               co.bonus_percentage AS co_pct, co.expires_at AS co_expires_at, co.reason AS co_reason
+        FROM ref
+        LEFT JOIN co ON TRUE
+    """, user_id, now)
+    row = row or {}
+    count = row.get('referral_count') or 0
+    
+    # 1. Individual override (already filtered to active and not expired)
+    if row.get('co_pct') is not None:
+        return {
+            "success": True,
+            "user_id": user_id,
+            "referral_count": count,
+            "effective_percentage": row['co_pct'],
+            "source": "individual_override",
+            "reason": row['co_reason'],
+            "details": {
+                "bonus_percentage": row['co_pct'],
+                "expires_at": row['co_expires_at'],
+                "reason": row['co_reason']
             }
+        }
     
-    # 2. Check for active global override
-    global_override = await fetch_one("""
-        SELECT name, bonus_percentage, description
-        FROM referral_global_overrides
-        WHERE is_active = TRUE AND start_date <= $1 AND end_date >= $1
-        ORDER BY bonus_percentage DESC
-        LIMIT 1
-    """, now)
-    
+    # 2. Active global override (cached)
+    global_override = await get_current_global_override(now)
     if global_override:
         return {
             "success": True,
@@ -458,20 +722,15 @@ async def get_effective_bonus(
             "effective_percentage": global_override['bonus_percentage'],
             "source": "global_campaign",
             "campaign_name": global_override['name'],
-            "details": dict(global_override)
+            "details": {
+                "name": global_override['name'],
+                "bonus_percentage": global_override['bonus_percentage'],
+                "description": global_override['description']
+            }
         }
     
-    # 3. Calculate tier-based percentage
-    tier = await fetch_one("""
-        SELECT tier_name, bonus_percentage, description
-        FROM referral_tiers
-        WHERE is_active = TRUE
-          AND min_referrals <= $1
-          AND (max_referrals IS NULL OR max_referrals >= $1)
-        ORDER BY min_referrals DESC
-        LIMIT 1
-    """, count)
-    
+    # 3. Tier-based percentage (cached tier definitions)
+    tier = (await _TIER_CACHE.get()).resolve(count)
     if tier:
         return {
             "success": True,
@@ -480,7 +739,11 @@ async def get_effective_bonus(
             "effective_percentage": tier['bonus_percentage'],
             "source": "tier",
             "tier_name": tier['tier_name'],
-            "details": dict(tier)
+            "details": {
+                "tier_name": tier['tier_name'],
+                "bonus_percentage": tier['bonus_percentage'],
+                "description": tier['description']
+            }
         }
     
     # Default fallback
@@ -494,67 +757,176 @@ async def get_effective_bonus(
     }
 
 
+# ==================== EFFECTIVE BONUS (BATCH) ====================
+
+# A background task refreshes the materialized view on this interval; reads never refresh it
+_EFFECTIVE_BONUS_MV_REFRESH_SECONDS = 300
+_EFFECTIVE_BONUS_MV_LOCK = asyncio.Lock()
+_effective_bonus_mv_task: Optional[asyncio.Task] = None
+
+
+async def refresh_effective_bonus_mv(force: bool = False) -> bool:
+    """
+    Refresh effective_bonus_mv without blocking readers.
+    Workers share an advisory lock; unless forced, a refresh already running elsewhere is skipped.
+    """
+    async with _EFFECTIVE_BONUS_MV_LOCK:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            if force:
+                await conn.execute("SELECT pg_advisory_lock(hashtext('effective_bonus_mv'))")
+            elif not await conn.fetchval("SELECT pg_try_advisory_lock(hashtext('effective_bonus_mv'))"):
+                return False
+            try:
+                await conn.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY effective_bonus_mv")
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext('effective_bonus_mv'))")
+    return True
+
+
+async def _run_effective_bonus_mv_refresher():
+    """Refresh effective_bonus_mv every _EFFECTIVE_BONUS_MV_REFRESH_SECONDS"""
+    while True:
+        await asyncio.sleep(_EFFECTIVE_BONUS_MV_REFRESH_SECONDS)
+        try:
+            await refresh_effective_bonus_mv()
+        except Exception as e:
+            logger.warning(f"effective_bonus_mv refresh failed: {e}")
+
+
+@router.on_event("startup")
+async def start_effective_bonus_mv_refresher():
+    """Start the periodic effective_bonus_mv refresh"""
+    global _effective_bonus_mv_task
+    if _effective_bonus_mv_task is None or _effective_bonus_mv_task.done():
+        _effective_bonus_mv_task = asyncio.create_task(_run_effective_bonus_mv_refresher())
+
+
+@router.on_event("shutdown")
+async def stop_effective_bonus_mv_refresher():
+    """Stop the periodic effective_bonus_mv refresh"""
+    global _effective_bonus_mv_task
+    task, _effective_bonus_mv_task = _effective_bonus_mv_task, None
+    if task is None:
+        return
+    
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+@router.get("/effective-bonus", summary="Effective bonus for many users")
+async def get_effective_bonus_batch(
+    request: Request,
+    user_id: Optional[List[str]] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    authorization: str = Header(...)
+):
+    """
+    Read precomputed effective bonuses from effective_bonus_mv (refreshed in the background).
+    Pass user_id repeatedly to select specific users; otherwise pages over all users.
+    """
+    await require_admin_access(request, authorization)
+    
+    rows = await fetch_all("""
+        SELECT user_id, referral_count, effective_percentage, source,
+               tier_name, campaign_name, refreshed_at
+        FROM effective_bonus_mv
+        WHERE $1::text[] IS NULL OR user_id = ANY($1::text[])
+        ORDER BY user_id
+        LIMIT $2 OFFSET $3
+    """, user_id, limit, offset)
+    
+    return ORJSONResponse({
+        "success": True,
+        "results": rows
+    })
+
+
+@router.post("/effective-bonus/refresh", summary="Refresh precomputed effective bonuses")
+async def refresh_effective_bonus(request: Request, authorization: str = Header(...)):
+    """Force a refresh of effective_bonus_mv"""
+    await require_admin_access(request, authorization)
+    await refresh_effective_bonus_mv(force=True)
+    return {"success": True, "message": "Effective bonuses refreshed"}
+
+
 # ==================== PUBLIC: USER'S OWN TIER INFO ====================
 
+# Referral count and active client override for one user
+_MY_TIER_SQL = """
+    WITH ref AS (
+        SELECT COALESCE((SELECT referral_count FROM users WHERE user_id = $1), 0) AS c
+    ),
+    co AS (
+        SELECT bonus_percentage FROM referral_client_overrides
+        WHERE user_id = $1 AND is_active = TRUE
+          AND (expires_at IS NULL OR expires_at > $2)
+        LIMIT 1
+    )
+    SELECT ref.c AS referral_count, co.bonus_percentage AS co_pct
+    FROM ref
+    LEFT JOIN co ON TRUE
+"""
+
+
 @router.get("/my-tier", summary="Get current user's tier info")
-async def get_my_tier(request: Request, authorization: str = Header(...)):
+async def get_my_tier(
+    request: Request,
+    authorization: str = Header(...),
+    now: datetime = Depends(utcnow)
+):
     """Get the current user's referral tier and bonus percentage"""
-    from ..core.auth import get_current_user
-    
-    user = await get_current_user(request, authorization, None)
-    await ensure_tier_tables()
-    
-    now = datetime.now(timezone.utc)
-    
-    # Get referral count
-    referral_count = await fetch_one("""
-        SELECT COUNT(*) as count FROM users WHERE referred_by_user_id = $1
-    """, user.user_id)
-    count = referral_count['count'] if referral_count else 0
-    
-    # Get all tiers for progress display
-    all_tiers = await fetch_all("""
-        SELECT tier_name, min_referrals, max_referrals, bonus_percentage
-        FROM referral_tiers
-        WHERE is_active = TRUE
-        ORDER BY min_referrals ASC
-    """)
+    user = await _request_user(request, authorization)
+    
+    # Per-user row (referral count + active client override) runs alongside
+    # the cached tier and campaign lookups, which may need a reload
+    row, tiers, global_override = await asyncio.gather(
+        fetch_one(_MY_TIER_SQL, user.user_id, now),
+        _TIER_CACHE.get(),
+        get_current_global_override(now)
+    )
+    row = row or {}
+    count = row.get('referral_count') or 0
+    
+    # Tiers for progress display
+    all_tiers = [
+        {
+            "tier_name": t['tier_name'],
+            "min_referrals": t['min_referrals'],
+            "max_referrals": t['max_referrals'],
+            "bonus_percentage": t['bonus_percentage']
+        }
+        for t in tiers.rows
+    ]
     
-    # Calculate effective bonus
+    # Calculate effective bonus: current tier is the last one reached,
+    # next tier the first one not yet reached
     effective_pct = 10.0
     current_tier = "Starter"
     next_tier = None
     referrals_to_next = None
     
-    for tier in all_tiers:
-        if count >= tier['min_referrals']:
-            effective_pct = tier['bonus_percentage']
-            current_tier = tier['tier_name']
-        else:
-            next_tier = tier['tier_name']
-            referrals_to_next = tier['min_referrals'] - count
-            break
-    
-    # Check for individual override
-    client_override = await fetch_one("""
-        SELECT bonus_percentage FROM referral_client_overrides
-        WHERE user_id = $1 AND is_active = TRUE
-          AND (expires_at IS NULL OR expires_at > $2)
-    """, user.user_id, now)
+    idx = tiers.position(count)
+    if idx > 0:
+        effective_pct = tiers.rows[idx - 1]['bonus_percentage']
+        current_tier = tiers.rows[idx - 1]['tier_name']
+    if idx < len(tiers.rows):
+        next_tier = tiers.rows[idx]['tier_name']
+        referrals_to_next = tiers.rows[idx]['min_referrals'] - count
     
-    if client_override:
-        effective_pct = client_override['bonus_percentage']
-    
-    # Check for global override
-    global_override = await fetch_one("""
-        SELECT bonus_percentage, name FROM referral_global_overrides
-        WHERE is_active = TRUE AND start_date <= $1 AND end_date >= $1
-        LIMIT 1
-    """, now)
+    # Individual override
+    has_client_override = row.get('co_pct') is not None
+    if has_client_override:
+        effective_pct = row['co_pct']
     
+    # Global override
     promotion_active = False
     promotion_name = None
-    if global_override and not client_override:
+    if global_override and not has_client_override:
         effective_pct = global_override['bonus_percentage']
         promotion_active = True
         promotion_name = global_override['name']
@@ -568,5 +940,5 @@ async def get_my_tier(request: Request, authorization: str = Header(...)):
         "referrals_to_next": referrals_to_next,
         "promotion_active": promotion_active,
         "promotion_name": promotion_name,
-        "all_tiers": [dict(t) for t in all_tiers]
+        "all_tiers": all_tiers
     }
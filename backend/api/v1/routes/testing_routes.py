@@ -0,0 +1,60 @@
+"""
+TEST-ONLY Fixture Routes
+Collapses multi-call test setup flows into a single request.
+
+SECURITY: This router is ONLY mounted when ENABLE_TEST_ENDPOINTS=true
+(default off) and ENV is not production.
+"""
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from ..services import create_user, authenticate_user, create_access_token, get_user_by_username
+from ..core.config import get_api_settings
+
+router = APIRouter(prefix="/testing", tags=["Testing - Fixtures"])
+
+settings = get_api_settings()
+
+
+class ReferralScenarioRequest(BaseModel):
+    """Referrer credentials for the scenario; the user is created if missing"""
+    username: str = Field(..., min_length=3, max_length=50)
+    password: str = Field(..., min_length=1)
+
+
+@router.post("/setup_referral_scenario", summary="Prepare a referrer for referral tests (TEST ONLY)")
+async def setup_referral_scenario(data: ReferralScenarioRequest):
+    """
+    Ensure the referrer exists, log it in and report its current referral count.
+    
+    Replaces the login + referral details round-trips a test makes before signing up
+    a referred user.
+    """
+    # Double-check: fail if somehow mounted without the opt-in
+    if not settings.enable_test_endpoints or settings.is_production:
+        raise HTTPException(status_code=404, detail="Not found")
+    
+    if not await get_user_by_username(data.username):
+        created, result = await create_user(data.username, data.password)
+        if not created:
+            raise HTTPException(status_code=400, detail=result)
+    
+    success, user = await authenticate_user(data.username, data.password)
+    if not success:
+        raise HTTPException(status_code=401, detail=user)
+    
+    access_token = create_access_token(user)
+    
+    from ..core.database import get_db
+    db = await get_db()
+    total_referrals = await db.users.count_documents({"referred_by_user_id": user['user_id']})
+    
+    return {
+        "success": True,
+        "access_token": access_token,
+        "token_type": "Bearer",
+        "expires_in_seconds": settings.access_token_expire_minutes * 60,
+        "user": user,
+        "referral_code": user['referral_code'],
+        "total_referrals": total_referrals
+    }
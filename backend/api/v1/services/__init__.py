@@ -4,10 +4,14 @@ API v1 Services Package
 from .auth_service import (
     create_user,
     authenticate_user,
+    create_access_token,
     create_magic_link,
+    create_magic_links_bulk,
     consume_magic_link,
     validate_token,
+    invalidate_user_cache,
     get_user_by_username,
+    pick_free_referral_code,
     log_audit,
 )
 
@@ -54,10 +58,14 @@ __all__ = [
     # Auth
     "create_user",
     "authenticate_user",
+    "create_access_token",
     "create_magic_link",
+    "create_magic_links_bulk",
     "consume_magic_link",
     "validate_token",
+    "invalidate_user_cache",
     "get_user_by_username",
+    "pick_free_referral_code",
     "log_audit",
     
     # Referral
@@ -2,13 +2,17 @@
 API v1 Authentication Service
 Handles user authentication, magic links, and session management
 """
+import asyncio
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, List
+
+from pymongo.errors import DuplicateKeyError
 
 from ..core.database import fetch_one, fetch_all, execute, execute_returning
 from ..core.security import (
-    hash_password, verify_password, generate_referral_code,
+    hash_password, hash_password_async, verify_password_async, password_needs_rehash, generate_referral_code,
     generate_magic_link_token, generate_session_token, create_jwt_token,
     decode_jwt_token, check_brute_force, record_failed_attempt, clear_failed_attempts
 )
@@ -17,6 +21,53 @@ from ..models import SignupResponse
 
 settings = get_api_settings()
 
+# Settings read on every auth call, bound once
+_ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+_MAGIC_LINK_EXPIRE_MINUTES = settings.magic_link_expire_minutes
+_MAGIC_LINK_BASE_URL = settings.magic_link_base_url
+
+# Statements are module constants so the driver's statement cache sees identical SQL text
+_SQL_INSERT_MAGIC_LINKS = '''
+    INSERT INTO magic_links (user_id, token, expires_at)
+    SELECT * FROM unnest($1::text[], $2::text[], $3::timestamptz[])
+'''
+
+_SQL_SELECT_MAGIC_LINK = '''
+    SELECT ml.user_id, ml.expires_at, u.username, u.display_name, u.referral_code, u.role
+    FROM magic_links ml
+    JOIN users u ON ml.user_id = u.user_id
+    WHERE ml.token = $1 AND ml.consumed = FALSE
+'''
+
+_SQL_CONSUME_MAGIC_LINK = '''
+    WITH consumed AS (
+        UPDATE magic_links SET consumed = TRUE, consumed_at = NOW()
+        WHERE token = $1 AND consumed = FALSE
+        RETURNING user_id
+    )
+    INSERT INTO sessions (user_id, access_token, expires_at)
+    SELECT user_id, $2, $3 FROM consumed
+    RETURNING user_id
+'''
+
+_SQL_INSERT_AUDIT_LOG = '''
+    INSERT INTO audit_logs (log_id, user_id, username, action, resource_type, resource_id, details, ip_address, user_agent)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+'''
+
+_SQL_INSERT_AUDIT_LOG_BATCH = '''
+    INSERT INTO audit_logs (log_id, user_id, username, action, resource_type, resource_id, details, ip_address, user_agent)
+    SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::text[], $7::jsonb[], $8::text[], $9::text[])
+'''
+
+# Signup retries when a generated referral code collides
+REFERRAL_CODE_INSERT_ATTEMPTS = 5
+# Candidates checked per query when picking a replacement referral code
+REFERRAL_CODE_CANDIDATES = 8
+
+# Verified against on unknown usernames so both login failure paths cost the same
+_DUMMY_PASSWORD_HASH = hash_password("!invalid!")
+
 
 async def create_user(
     username: str,
@@ -30,27 +81,32 @@ async def create_user(
     """
     from ..core.database import get_db, serialize_doc, create_user_doc, generate_uuid
     
+    # Normalize inputs once; everything below uses the normalized values
     username = username.lower().strip()
+    normalized_ref = referred_by_code.upper() if referred_by_code else None
     
     # Use username as display_name if not provided
     if not display_name:
         display_name = username.title()
     
-    # Check if username exists in MongoDB
     db = await get_db()
-    existing = await db.users.find_one({"username": username})
-    if existing:
+    
+    # Reject taken usernames before paying for a password hash; the unique
+    # index below still catches signups racing past this check
+    if await db.users.find_one({"username": username}, {"_id": 1}):
         return False, {
             "message": "Username already exists",
             "error_code": ErrorCodes.USER_ALREADY_EXISTS
         }
     
     # Validate referral code if provided
+    # Referrer doc is kept for the REFERRAL_JOINED notification below
     referrer_user_id = None
-    if referred_by_code:
+    referrer = None
+    if normalized_ref:
         referrer = await db.users.find_one(
-            {"referral_code": referred_by_code.upper(), "is_active": True},
-            {"user_id": 1, "username": 1}
+            {"referral_code": normalized_ref, "is_active": True},
+            {"user_id": 1, "username": 1, "display_name": 1}
         )
         referrer = serialize_doc(referrer)
         if not referrer:
@@ -60,36 +116,84 @@ async def create_user(
             }
         referrer_user_id = referrer['user_id']
     
-    # Generate unique referral code
-    referral_code = generate_referral_code()
-    while await db.users.find_one({"referral_code": referral_code}):
-        referral_code = generate_referral_code()
-    
     # Create user in MongoDB
     user_id = generate_uuid()
-    password_hash = hash_password(password)
+    password_hash = await hash_password_async(password)
     
     user_doc = create_user_doc(
         user_id=user_id,
         username=username,
         password_hash=password_hash,
         display_name=display_name,
-        referral_code=referral_code,
-        referred_by_code=referred_by_code.upper() if referred_by_code else None,
+        referral_code=generate_referral_code(),
+        referred_by_code=normalized_ref,
         referred_by_user_id=referrer_user_id
     )
     
-    await db.users.insert_one(user_doc)
-    
-    # Log audit (compatibility layer will handle this)
-    await log_audit(user_id, username, "user.signup", "user", user_id, {
-        "referred_by": referred_by_code
-    })
+    # Unique indexes settle username races; a referral code collision just
+    # retries with a fresh code
+    for attempt in range(REFERRAL_CODE_INSERT_ATTEMPTS):
+        try:
+            await db.users.insert_one(user_doc)
+            break
+        except DuplicateKeyError as e:
+            key_pattern = (e.details or {}).get("keyPattern") or {}
+            if "username" in key_pattern:
+                return False, {
+                    "message": "Username already exists",
+                    "error_code": ErrorCodes.USER_ALREADY_EXISTS
+                }
+            if "referral_code" not in key_pattern or attempt == REFERRAL_CODE_INSERT_ATTEMPTS - 1:
+                raise
+            # If every candidate is taken the next insert attempt collides and retries
+            user_doc["referral_code"] = await pick_free_referral_code(db) or generate_referral_code()
+            user_doc.pop("_id", None)
+    referral_code = user_doc["referral_code"]
+    
+    # Audit and signup notifications are independent; run them concurrently
+    await asyncio.gather(
+        log_audit(user_id, username, "user.signup", "user", user_id, {
+            "referred_by": normalized_ref
+        }),
+        _emit_signup_notifications(user_id, username, display_name, normalized_ref, referrer)
+    )
     
-    # Emit USER_REGISTERED notification
+    return True, {
+        "user_id": user_id,
+        "username": username,
+        "display_name": display_name,
+        "referral_code": referral_code,
+        "referred_by_code": normalized_ref
+    }
+
+
+async def pick_free_referral_code(db) -> Optional[str]:
+    """
+    Generate a batch of referral codes and return one not yet taken, in a single query.
+    Returns None if every candidate is taken.
+    """
+    candidates = [generate_referral_code() for _ in range(REFERRAL_CODE_CANDIDATES)]
+    taken = {
+        doc["referral_code"]
+        async for doc in db.users.find(
+            {"referral_code": {"$in": candidates}},
+            {"_id": 0, "referral_code": 1}
+        )
+    }
+    return next((c for c in candidates if c not in taken), None)
+
+
+async def _emit_signup_notifications(
+    user_id: str,
+    username: str,
+    display_name: str,
+    referred_by_code: Optional[str],
+    referrer: Optional[Dict[str, Any]]
+):
+    """Emit USER_REGISTERED (and REFERRAL_JOINED for referred users) concurrently"""
     try:
         from ..core.notification_router import emit_event, EventType
-        await emit_event(
+        events = [emit_event(
             event_type=EventType.USER_REGISTERED,
             title="🆕 New Client Registered",
             message=f"A new client has joined the platform!\n\nUsername: @{username}\nDisplay Name: {display_name}" + (f"\nReferred by: {referred_by_code}" if referred_by_code else ""),
@@ -100,40 +204,28 @@ async def create_user(
             display_name=display_name,
             extra_data={"referred_by": referred_by_code},
             requires_action=False
-        )
+        )]
         
         # If user was referred, also emit REFERRAL_JOINED
-        if referrer_user_id:
-            referrer = await db.users.find_one(
-                {"user_id": referrer_user_id},
-                {"username": 1, "display_name": 1}
-            )
-            referrer = serialize_doc(referrer)
-            if referrer:
-                await emit_event(
-                    event_type=EventType.REFERRAL_JOINED,
-                    title="👥 New Referral Joined",
-                    message=f"A new user joined via referral!\n\nNew User: @{username}\nReferred By: @{referrer['username']}",
-                    reference_id=user_id,
-                    reference_type="referral",
-                    user_id=referrer_user_id,
-                    username=referrer['username'],
-                    display_name=referrer['display_name'],
-                    extra_data={"new_user": username, "referral_code": referred_by_code},
-                    requires_action=False
-                )
+        if referrer:
+            events.append(emit_event(
+                event_type=EventType.REFERRAL_JOINED,
+                title="👥 New Referral Joined",
+                message=f"A new user joined via referral!\n\nNew User: @{username}\nReferred By: @{referrer['username']}",
+                reference_id=user_id,
+                reference_type="referral",
+                user_id=referrer['user_id'],
+                username=referrer['username'],
+                display_name=referrer['display_name'],
+                extra_data={"new_user": username, "referral_code": referred_by_code},
+                requires_action=False
+            ))
+        
+        await asyncio.gather(*events)
     except Exception as e:
         # Don't fail signup if notification fails
         import logging
         logging.getLogger(__name__).warning(f"Failed to send signup notification: {e}")
-    
-    return True, {
-        "user_id": user_id,
-        "username": username,
-        "display_name": display_name,
-        "referral_code": referral_code,
-        "referred_by_code": referred_by_code.upper() if referred_by_code else None
-    }
 
 
 async def authenticate_user(username: str, password: str) -> Tuple[bool, Dict[str, Any]]:
@@ -155,10 +247,16 @@ async def authenticate_user(username: str, password: str) -> Tuple[bool, Dict[st
     # Get user from MongoDB
     from ..core.database import get_db, serialize_doc
     db = await get_db()
-    user = await db.users.find_one({"username": username})
+    user = await db.users.find_one(
+        {"username": username},
+        {"_id": 0, "user_id": 1, "username": 1, "display_name": 1, "password_hash": 1,
+         "referral_code": 1, "role": 1, "is_active": 1}
+    )
     user = serialize_doc(user)
     
     if not user:
+        # Burn a hash verification anyway so response time doesn't reveal valid usernames
+        await verify_password_async(password, _DUMMY_PASSWORD_HASH)
         record_failed_attempt(username)
         return False, {
             "message": "Invalid credentials",
@@ -166,7 +264,7 @@ async def authenticate_user(username: str, password: str) -> Tuple[bool, Dict[st
         }
     
     # Verify password
-    if not verify_password(password, user['password_hash']):
+    if not await verify_password_async(password, user['password_hash']):
         record_failed_attempt(username)
         return False, {
             "message": "Invalid credentials",
@@ -183,6 +281,13 @@ async def authenticate_user(username: str, password: str) -> Tuple[bool, Dict[st
     # Clear failed attempts
     clear_failed_attempts(username)
     
+    # Upgrade legacy bcrypt hashes to argon2id now that the plaintext is known
+    if password_needs_rehash(user['password_hash']):
+        await db.users.update_one(
+            {"user_id": user['user_id']},
+            {"$set": {"password_hash": await hash_password_async(password)}}
+        )
+    
     return True, {
         "user_id": user['user_id'],
         "username": user['username'],
@@ -192,29 +297,55 @@ async def authenticate_user(username: str, password: str) -> Tuple[bool, Dict[st
     }
 
 
+def create_access_token(user: Dict[str, Any]) -> str:
+    """Issue the login access token for a user returned by authenticate_user"""
+    return create_jwt_token({
+        "sub": user['user_id'],
+        "user_id": user['user_id'],
+        "username": user['username'],
+        "display_name": user['display_name'],
+        "referral_code": user['referral_code'],
+        "role": user.get('role', 'user'),
+        "type": "access"
+    })
+
+
 async def create_magic_link(user_id: str, username: str) -> Dict[str, Any]:
     """
     Create a magic link for user authentication.
     Returns magic link data.
     """
-    token = generate_magic_link_token()
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.magic_link_expire_minutes)
+    return (await create_magic_links_bulk([(user_id, username)]))[0]
+
+
+async def create_magic_links_bulk(users: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Create magic links for many (user_id, username) pairs with a single insert.
+    Returns magic link data in the same order.
+    """
+    if not users:
+        return []
     
-    await execute('''
-        INSERT INTO magic_links (user_id, token, expires_at)
-        VALUES ($1, $2, $3)
-    ''', user_id, token, expires_at)
+    tokens = [generate_magic_link_token() for _ in users]
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=_MAGIC_LINK_EXPIRE_MINUTES)
     
-    magic_link = f"{settings.magic_link_base_url}?token={token}"
+    await execute(
+        _SQL_INSERT_MAGIC_LINKS,
+        [user_id for user_id, _ in users], tokens, [expires_at] * len(users)
+    )
     
-    # Log audit
-    await log_audit(user_id, username, "auth.magic_link_created", "magic_link", token[:16])
+    # Log audit (queued for the batched writer)
+    for (user_id, username), token in zip(users, tokens):
+        await log_audit(user_id, username, "auth.magic_link_created", "magic_link", token[:16])
     
-    return {
-        "magic_link": magic_link,
-        "token": token,
-        "expires_in_seconds": settings.magic_link_expire_minutes * 60
-    }
+    return [
+        {
+            "magic_link": f"{_MAGIC_LINK_BASE_URL}?token={token}",
+            "token": token,
+            "expires_in_seconds": _MAGIC_LINK_EXPIRE_MINUTES * 60
+        }
+        for token in tokens
+    ]
 
 
 async def consume_magic_link(token: str) -> Tuple[bool, Dict[str, Any]]:
@@ -222,13 +353,8 @@ async def consume_magic_link(token: str) -> Tuple[bool, Dict[str, Any]]:
     Consume a magic link and return session token.
     Returns (success, session_data/error)
     """
-    # Find magic link
-    magic_link = await fetch_one('''
-        SELECT ml.*, u.username, u.display_name, u.referral_code
-        FROM magic_links ml
-        JOIN users u ON ml.user_id = u.user_id
-        WHERE ml.token = $1 AND ml.consumed = FALSE
-    ''', token)
+    # Find magic link together with the user fields the session needs
+    magic_link = await fetch_one(_SQL_SELECT_MAGIC_LINK, token)
     
     if not magic_link:
         return False, {
@@ -247,17 +373,6 @@ async def consume_magic_link(token: str) -> Tuple[bool, Dict[str, Any]]:
             "error_code": ErrorCodes.TOKEN_EXPIRED
         }
     
-    # Mark as consumed
-    await execute('''
-        UPDATE magic_links SET consumed = TRUE, consumed_at = $1 WHERE token = $2
-    ''', datetime.now(timezone.utc), token)
-    
-    # Get full user info including role
-    user = await fetch_one(
-        "SELECT role FROM users WHERE user_id = $1",
-        magic_link['user_id']
-    )
-    
     # Create session
     access_token = create_jwt_token({
         "sub": magic_link['user_id'],
@@ -265,29 +380,69 @@ async def consume_magic_link(token: str) -> Tuple[bool, Dict[str, Any]]:
         "type": "access"
     })
     
-    session_expires = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
+    session_expires = datetime.now(timezone.utc) + timedelta(minutes=_ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    await execute('''
-        INSERT INTO sessions (user_id, access_token, expires_at)
-        VALUES ($1, $2, $3)
-    ''', magic_link['user_id'], access_token, session_expires)
+    # Mark consumed and record the session in one statement; no row back means
+    # a concurrent request consumed the link first
+    session = await execute_returning(_SQL_CONSUME_MAGIC_LINK, token, access_token, session_expires)
+    
+    if not session:
+        return False, {
+            "message": "Invalid or already used magic link",
+            "error_code": ErrorCodes.INVALID_TOKEN
+        }
     
     # Log audit
     await log_audit(magic_link['user_id'], magic_link['username'], "auth.magic_link_consumed", "session", access_token[:16])
     
     return True, {
         "access_token": access_token,
-        "expires_in_seconds": settings.access_token_expire_minutes * 60,
+        "expires_in_seconds": _ACCESS_TOKEN_EXPIRE_MINUTES * 60,
         "user": {
             "user_id": magic_link['user_id'],
             "username": magic_link['username'],
             "display_name": magic_link['display_name'],
             "referral_code": magic_link['referral_code'],
-            "role": user.get('role', 'user') if user else 'user'
+            "role": magic_link.get('role') or 'user'
         }
     }
 
 
+# validate_token runs on every authenticated request; user lookups are cached
+# briefly per user_id and evicted explicitly when an account changes
+USER_CACHE_TTL_SECONDS = 30
+USER_CACHE_MAX_SIZE = 10_000
+_user_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def invalidate_user_cache(user_id: str):
+    """Drop a cached validate_token user so the next request re-reads it"""
+    _user_cache.pop(user_id, None)
+
+
+async def _get_token_user(user_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch the fields validate_token needs, via the TTL cache"""
+    now = time.monotonic()
+    cached = _user_cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    from ..core.database import get_db, serialize_doc
+    db = await get_db()
+    user = await db.users.find_one(
+        {"user_id": user_id},
+        {"user_id": 1, "username": 1, "display_name": 1, "referral_code": 1, "role": 1, "is_active": 1}
+    )
+    user = serialize_doc(user)
+    
+    if user:
+        if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            _user_cache.pop(next(iter(_user_cache)), None)
+        _user_cache[user_id] = (now + USER_CACHE_TTL_SECONDS, user)
+    return user
+
+
 async def validate_token(token: str) -> Tuple[bool, Dict[str, Any]]:
     """
     Validate an access token.
@@ -302,14 +457,8 @@ async def validate_token(token: str) -> Tuple[bool, Dict[str, Any]]:
     if not user_id:
         return False, {"message": "Invalid token", "error_code": ErrorCodes.INVALID_TOKEN}
     
-    # Verify user exists and is active from MongoDB
-    from ..core.database import get_db, serialize_doc
-    db = await get_db()
-    user = await db.users.find_one(
-        {"user_id": user_id},
-        {"user_id": 1, "username": 1, "display_name": 1, "referral_code": 1, "role": 1, "is_active": 1}
-    )
-    user = serialize_doc(user)
+    # Verify user exists and is active (cached for USER_CACHE_TTL_SECONDS)
+    user = await _get_token_user(user_id)
     
     if not user or not user.get('is_active', True):
         return False, {"message": "User not found or disabled", "error_code": ErrorCodes.USER_NOT_FOUND}
@@ -338,6 +487,79 @@ async def get_user_by_username(username: str) -> Optional[Dict[str, Any]]:
     return serialize_doc(user)
 
 
+# ==================== AUDIT LOG WRITER ====================
+
+# Audit rows are queued and written in batches by a background task
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL_SECONDS = 0.05
+# Rows beyond this are written directly instead of queued, bounding memory during a DB outage
+AUDIT_QUEUE_MAX_SIZE = 10_000
+
+# Queued by stop_audit_writer after the last row; the writer flushes and exits on it
+_AUDIT_STOP = object()
+
+_audit_queue: Optional[asyncio.Queue] = None
+_audit_writer_task: Optional[asyncio.Task] = None
+
+
+async def start_audit_writer():
+    """Start the background audit writer (called on app startup)"""
+    global _audit_queue, _audit_writer_task
+    if _audit_writer_task and not _audit_writer_task.done():
+        return
+    _audit_queue = asyncio.Queue(maxsize=AUDIT_QUEUE_MAX_SIZE)
+    _audit_writer_task = asyncio.create_task(_run_audit_writer(_audit_queue))
+
+
+async def stop_audit_writer():
+    """Stop the background audit writer once every queued row has been written"""
+    global _audit_queue, _audit_writer_task
+    queue, task = _audit_queue, _audit_writer_task
+    # New audit rows go straight to the database from here on
+    _audit_queue, _audit_writer_task = None, None
+    if task is None or task.done():
+        return
+    
+    await queue.put(_AUDIT_STOP)
+    await task
+
+
+async def _run_audit_writer(queue: asyncio.Queue):
+    """Drain the audit queue, flushing every AUDIT_FLUSH_INTERVAL_SECONDS or AUDIT_BATCH_SIZE rows"""
+    loop = asyncio.get_running_loop()
+    while True:
+        row = await queue.get()
+        if row is _AUDIT_STOP:
+            return
+        batch = [row]
+        stopping = False
+        deadline = loop.time() + AUDIT_FLUSH_INTERVAL_SECONDS
+        while len(batch) < AUDIT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                row = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if row is _AUDIT_STOP:
+                stopping = True
+                break
+            batch.append(row)
+        await _write_audit_batch(batch)
+        if stopping:
+            return
+
+
+async def _write_audit_batch(rows: list):
+    """Insert a batch of audit rows in a single statement"""
+    try:
+        await execute(_SQL_INSERT_AUDIT_LOG_BATCH, *(list(col) for col in zip(*rows)))
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).error(f"Failed to write {len(rows)} audit log rows: {e}")
+
+
 async def log_audit(
     user_id: Optional[str],
     username: Optional[str],
@@ -348,11 +570,17 @@ async def log_audit(
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None
 ):
-    """Log an audit event"""
+    """Log an audit event (queued for the background writer when it is running)"""
     import json
-    log_id = str(uuid.uuid4())
-    await execute('''
-        INSERT INTO audit_logs (log_id, user_id, username, action, resource_type, resource_id, details, ip_address, user_agent)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-    ''', log_id, user_id, username, action, resource_type, resource_id,
-       json.dumps(details) if details else None, ip_address, user_agent)
+    row = (
+        str(uuid.uuid4()), user_id, username, action, resource_type, resource_id,
+        json.dumps(details) if details else None, ip_address, user_agent
+    )
+    if _audit_queue is not None:
+        try:
+            _audit_queue.put_nowait(row)
+            return
+        except asyncio.QueueFull:
+            pass
+    
+    await execute(_SQL_INSERT_AUDIT_LOG, *row)
@@ -259,6 +259,10 @@ async def startup_event():
     # Initialize database
     await init_api_v1_db()
     
+    # Start batched audit log writer
+    from api.v1.services.auth_service import start_audit_writer
+    await start_audit_writer()
+    
     # Initialize order lifecycle audit table
     # TEMPORARILY DISABLED - needs MongoDB conversion
     # from api.v1.core.order_lifecycle import ensure_audit_table_exists
@@ -276,6 +280,10 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown handler."""
+    # Flush queued audit rows before the database goes away
+    from api.v1.services.auth_service import stop_audit_writer
+    await stop_audit_writer()
+    
     await close_api_v1_db()
     logger.info("Application shutdown complete")
 
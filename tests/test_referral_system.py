@@ -18,16 +18,31 @@ TEST_REFERRER = {"username": "testref001", "password": "TestPass123!"}
 TEST_REFERRED = {"username": "referreduser01", "password": "TestPass123!"}
 
 
+@pytest.fixture(scope="session")
+def http_session():
+    """Single keep-alive session shared by every test class"""
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="class")
+def referrer_token(http_session):
+    """Log in as the referrer once per test class; yields (access_token, referral_code)"""
+    response = http_session.post(f"{BASE_URL}/api/v1/auth/login", json=TEST_REFERRER)
+    assert response.status_code == 200, f"Referrer login failed: {response.text}"
+    data = response.json()
+    yield data["access_token"], data.get("user", {}).get("referral_code")
+
+
 class TestReferralSystem:
     """Test the referral system end-to-end"""
     
     @pytest.fixture(autouse=True)
-    def setup(self):
+    def setup(self, http_session):
         """Setup test session"""
-        self.session = requests.Session()
-        self.session.headers.update({"Content-Type": "application/json"})
-        yield
-        self.session.close()
+        self.session = http_session
     
     def test_01_health_check(self):
         """Verify API is healthy"""
@@ -55,12 +70,9 @@ class TestReferralSystem:
         print(f"   Referral code: {self.referrer_user.get('referral_code')}")
         return data
     
-    def test_03_get_referrer_referral_details(self):
+    def test_03_get_referrer_referral_details(self, referrer_token):
         """Get referral details for the referrer user"""
-        # First login
-        login_resp = self.session.post(f"{BASE_URL}/api/v1/auth/login", json=TEST_REFERRER)
-        assert login_resp.status_code == 200
-        token = login_resp.json()["access_token"]
+        token, _ = referrer_token
         
         # Get referral details
         headers = {"Authorization": f"Bearer {token}"}
@@ -101,13 +113,10 @@ class TestReferralSystem:
         assert "Invalid referral code" in str(data) or "error" in str(data).lower()
         print(f"✅ Invalid referral code correctly rejected")
     
-    def test_05_signup_with_valid_referral_code(self):
+    def test_05_signup_with_valid_referral_code(self, referrer_token):
         """Test signup with a valid referral code (O5037H70 from testref001)"""
-        # First get the referrer's referral code
-        login_resp = self.session.post(f"{BASE_URL}/api/v1/auth/login", json=TEST_REFERRER)
-        assert login_resp.status_code == 200
-        referrer_data = login_resp.json()
-        referral_code = referrer_data.get("user", {}).get("referral_code", "O5037H70")
+        # Referral code comes from the shared referrer login
+        referral_code = referrer_token[1] or "O5037H70"
         print(f"Using referral code: {referral_code}")
         
         # Create a new user with the referral code
@@ -131,12 +140,9 @@ class TestReferralSystem:
         print(f"   Referred by: {data.get('referred_by_code')}")
         return data
     
-    def test_06_verify_referral_count_incremented(self):
+    def test_06_verify_referral_count_incremented(self, referrer_token):
         """Verify that the referrer's total_referrals count has incremented"""
-        # Login as referrer
-        login_resp = self.session.post(f"{BASE_URL}/api/v1/auth/login", json=TEST_REFERRER)
-        assert login_resp.status_code == 200
-        token = login_resp.json()["access_token"]
+        token, _ = referrer_token
         
         # Get referral details
         headers = {"Authorization": f"Bearer {token}"}
@@ -170,26 +176,25 @@ class TestReferralSystem:
     def test_08_full_referral_flow(self):
         """
         Full end-to-end referral flow:
-        1. Login as referrer
-        2. Get initial referral count
-        3. Create new user with referral code
-        4. Verify referral count incremented
+        1. Set up referrer (token, code and initial count in one call)
+        2. Create new user with referral code
+        3. Verify referral count incremented
         """
-        # Step 1: Login as referrer
-        login_resp = self.session.post(f"{BASE_URL}/api/v1/auth/login", json=TEST_REFERRER)
-        assert login_resp.status_code == 200
-        token = login_resp.json()["access_token"]
-        referral_code = login_resp.json().get("user", {}).get("referral_code")
-        print(f"Step 1: Logged in as referrer, code: {referral_code}")
-        
-        # Step 2: Get initial referral count
+        # Step 1: Set up referrer via the test fixture endpoint
+        setup_resp = self.session.post(
+            f"{BASE_URL}/api/v1/testing/setup_referral_scenario", json=TEST_REFERRER
+        )
+        if setup_resp.status_code == 404:
+            pytest.skip("Test fixture endpoints not enabled (ENABLE_TEST_ENDPOINTS)")
+        assert setup_resp.status_code == 200, f"Scenario setup failed: {setup_resp.text}"
+        scenario = setup_resp.json()
+        token = scenario["access_token"]
+        referral_code = scenario["referral_code"]
+        initial_count = scenario["total_referrals"]
         headers = {"Authorization": f"Bearer {token}"}
-        initial_resp = self.session.get(f"{BASE_URL}/api/v1/portal/referrals/details", headers=headers)
-        assert initial_resp.status_code == 200
-        initial_count = initial_resp.json()["stats"]["total_referrals"]
-        print(f"Step 2: Initial referral count: {initial_count}")
+        print(f"Step 1: Referrer ready, code: {referral_code}, initial count: {initial_count}")
         
-        # Step 3: Create new user with referral code
+        # Step 2: Create new user with referral code
         unique_username = f"flowtest_{uuid.uuid4().hex[:8]}"
         signup_resp = self.session.post(f"{BASE_URL}/api/v1/auth/signup", json={
             "username": unique_username,
@@ -198,13 +203,13 @@ class TestReferralSystem:
             "referred_by_code": referral_code
         })
         assert signup_resp.status_code == 200, f"Signup failed: {signup_resp.text}"
-        print(f"Step 3: Created new user: {unique_username}")
+        print(f"Step 2: Created new user: {unique_username}")
         
-        # Step 4: Verify referral count incremented
+        # Step 3: Verify referral count incremented
         final_resp = self.session.get(f"{BASE_URL}/api/v1/portal/referrals/details", headers=headers)
         assert final_resp.status_code == 200
         final_count = final_resp.json()["stats"]["total_referrals"]
-        print(f"Step 4: Final referral count: {final_count}")
+        print(f"Step 3: Final referral count: {final_count}")
         
         assert final_count == initial_count + 1, f"Expected count to increment from {initial_count} to {initial_count + 1}, got {final_count}"
         print(f"✅ Full referral flow successful! Count incremented from {initial_count} to {final_count}")
@@ -214,12 +219,9 @@ class TestReferralDetailsAPI:
     """Test the /api/v1/portal/referrals/details endpoint specifically"""
     
     @pytest.fixture(autouse=True)
-    def setup(self):
+    def setup(self, http_session):
         """Setup test session"""
-        self.session = requests.Session()
-        self.session.headers.update({"Content-Type": "application/json"})
-        yield
-        self.session.close()
+        self.session = http_session
     
     def test_referral_details_requires_auth(self):
         """Verify that referral details endpoint requires authentication"""
@@ -228,12 +230,9 @@ class TestReferralDetailsAPI:
         assert response.status_code == 401, f"Expected 401 for unauthenticated request, got {response.status_code}"
         print(f"✅ Endpoint correctly requires authentication")
     
-    def test_referral_details_response_structure(self):
+    def test_referral_details_response_structure(self, referrer_token):
         """Verify the response structure of referral details"""
-        # Login first
-        login_resp = self.session.post(f"{BASE_URL}/api/v1/auth/login", json=TEST_REFERRER)
-        assert login_resp.status_code == 200
-        token = login_resp.json()["access_token"]
+        token, _ = referrer_token
         
         # Get referral details
         headers = {"Authorization": f"Bearer {token}"}
@@ -279,12 +278,9 @@ class TestSignupWithReferral:
     """Test signup endpoint with referral code handling"""
     
     @pytest.fixture(autouse=True)
-    def setup(self):
+    def setup(self, http_session):
         """Setup test session"""
-        self.session = requests.Session()
-        self.session.headers.update({"Content-Type": "application/json"})
-        yield
-        self.session.close()
+        self.session = http_session
     
     def test_signup_without_referral(self):
         """Test signup without a referral code"""